@@ -0,0 +1,11 @@
+"""Benchmarks for HydroToDo.
+
+Run from the project folder:
+
+    python3 -m benchmarks.run --tasks 100000 --output before.json
+    python3 -m benchmarks.run --tasks 100000 --output after.json
+    python3 -m benchmarks.compare before.json after.json
+
+Databases are generated by benchmarks.generate and the interface runs
+headless against benchmarks.fake_curses.
+"""
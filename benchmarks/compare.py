@@ -0,0 +1,64 @@
+"""Compare two benchmarks.run result files, median against median.
+
+    python3 -m benchmarks.compare before.json after.json --threshold 10
+
+Exits with status 1 when any result got worse by more than the threshold.
+"""
+
+import argparse
+import json
+
+
+def change(before, after):
+    """Relative change of after over before, positive meaning worse."""
+    if before["median"] == 0:
+        return 0.0
+    delta = (after["median"] - before["median"]) / before["median"]
+    # Throughputs (units per second) get worse as they go down
+    return -delta if before["unit"].endswith("/s") else delta
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=10.0,
+        help="percentage a result may get worse before it counts as a regression",
+    )
+    args = parser.parse_args()
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    print(
+        f"{'':32} {before['commit'] or 'before':>14} {after['commit'] or 'after':>14}"
+    )
+    regressions = 0
+    for name in sorted(set(before["results"]) | set(after["results"])):
+        old = before["results"].get(name)
+        new = after["results"].get(name)
+        if old is None or new is None:
+            only = "after" if old is None else "before"
+            print(f"{name:32} only in {only}")
+            continue
+        worse = change(old, new) * 100
+        flag = ""
+        if worse > args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        moved = (new["median"] / old["median"] - 1) * 100 if old["median"] else 0.0
+        print(
+            f"{name:32} {old['median']:>14.3f} {new['median']:>14.3f}"
+            f" {old['unit']:<9} {moved:+7.1f}%{flag}"
+        )
+    if before["params"] != after["params"]:
+        print("note: the runs used different parameters")
+    raise SystemExit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
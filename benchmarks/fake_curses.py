@@ -0,0 +1,167 @@
+"""A headless stand-in for the parts of curses HydroToDo uses.
+
+Windows keep their text in a list of strings, so drawing does comparable
+work to curses without a terminal. Input comes from a scripted key queue,
+and every getch() that would wait for a key (blocking or with a timeout)
+records a timestamp: the time between two of them is how long the program
+took to handle a key and draw the result. Scripted keys are always ready,
+so timeouts never expire.
+
+    hydrotodo.curses = fake_curses
+    stdscr = fake_curses.start(keys, height=40, width=120)
+    hydrotodo.main(stdscr)
+    fake_curses.marks  # perf_counter() at each waiting getch()
+"""
+
+import time
+from collections import deque
+
+
+class error(Exception):
+    pass
+
+
+A_NORMAL = 0
+A_BOLD = 1 << 16
+A_REVERSE = 1 << 17
+A_DIM = 1 << 18
+
+COLOR_BLACK = 0
+COLOR_RED = 1
+COLOR_GREEN = 2
+COLOR_YELLOW = 3
+COLOR_BLUE = 4
+COLOR_MAGENTA = 5
+COLOR_CYAN = 6
+COLOR_WHITE = 7
+
+KEY_DOWN = 258
+KEY_UP = 259
+KEY_LEFT = 260
+KEY_RIGHT = 261
+KEY_HOME = 262
+KEY_BACKSPACE = 263
+KEY_DC = 330
+KEY_END = 360
+KEY_RESIZE = 410
+
+# Scripted input shared by every window, and the getch() timestamps
+keys = deque()
+marks = []
+updates = 0
+_size = (40, 120)
+
+
+class Window:
+    def __init__(self, height, width):
+        self.height = height
+        self.width = width
+        self.rows = [" " * width] * height
+        self.y = 0
+        self.x = 0
+        self._delay = -1  # -1 blocks, 0 is nodelay, >0 a timeout in ms
+
+    def getmaxyx(self):
+        return self.height, self.width
+
+    def addstr(self, y, x, text, attr=0):
+        if not (0 <= y < self.height and 0 <= x < self.width):
+            raise error("addstr() returned ERR")
+        row = self.rows[y]
+        room = self.width - x
+        self.rows[y] = row[:x] + text[:room] + row[x + len(text[:room]) :]
+        if len(text) >= room:
+            # curses draws up to the edge, then fails to move the cursor on
+            raise error("addstr() returned ERR")
+        self.y, self.x = y, x + len(text)
+
+    def move(self, y, x):
+        if not (0 <= y < self.height and 0 <= x < self.width):
+            raise error("wmove() returned ERR")
+        self.y, self.x = y, x
+
+    def clrtoeol(self):
+        row = self.rows[self.y]
+        self.rows[self.y] = row[: self.x] + " " * (self.width - self.x)
+
+    def erase(self):
+        self.rows = [" " * self.width] * self.height
+
+    clear = erase
+
+    def refresh(self):
+        doupdate()
+
+    def noutrefresh(self):
+        pass
+
+    def keypad(self, flag):
+        pass
+
+    def nodelay(self, flag):
+        self._delay = 0 if flag else -1
+
+    def timeout(self, delay):
+        self._delay = delay
+
+    def getch(self):
+        if self._delay != 0:
+            marks.append(time.perf_counter())
+            if not keys:
+                raise error("scripted input exhausted")
+        return keys.popleft() if keys else -1
+
+    def text(self):
+        return "\n".join(self.rows)
+
+
+def start(script, height=40, width=120):
+    """Queue script (key codes or strings of printable keys) and return stdscr."""
+    global updates, _size
+    keys.clear()
+    for key in script:
+        if isinstance(key, str):
+            keys.extend(ord(ch) for ch in key)
+        else:
+            keys.append(key)
+    del marks[:]
+    updates = 0
+    _size = (height, width)
+    return Window(height, width)
+
+
+def newwin(height, width, y=0, x=0):
+    return Window(height, width)
+
+
+def doupdate():
+    global updates
+    updates += 1
+
+
+def ungetch(key):
+    keys.appendleft(key)
+
+
+def wrapper(func, *args):
+    return func(Window(*_size), *args)
+
+
+def color_pair(n):
+    return n << 8
+
+
+def curs_set(visibility):
+    pass
+
+
+def start_color():
+    pass
+
+
+def use_default_colors():
+    pass
+
+
+def init_pair(pair, fg, bg):
+    pass
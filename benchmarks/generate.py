@@ -0,0 +1,103 @@
+"""Generate synthetic HydroToDo databases of a given size.
+
+    python3 -m benchmarks.generate /tmp/bench.db --tasks 1000000 --categories 20
+"""
+
+import argparse
+import os
+import random
+
+from hydrotodo import Database
+
+WORDS = (
+    "review update fix write call email plan check buy clean send book prepare "
+    "draft test deploy refactor meeting report budget invoice release design "
+    "schedule backup migrate document sync order renew cancel confirm follow "
+    "the a for with about before after next weekly monthly urgent quick final "
+    "project client server kitchen garden car team docs notes tickets issues"
+).split()
+
+
+def random_text(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def generate_rows(tasks, categories, note_length, notes_ratio, done_ratio, seed):
+    """Yield rows for Database.import_todos; the same seed gives the same rows."""
+    rng = random.Random(seed)
+    names = ["General"] + [f"Category {i}" for i in range(1, categories)]
+    # Roughly six characters per word, spaces included
+    note_words = max(1, note_length // 6)
+    for i in range(tasks):
+        notes = ""
+        if note_length and rng.random() < notes_ratio:
+            # Several paragraphs, so wrapping sees embedded newlines
+            notes = "\n".join(
+                random_text(rng, max(1, note_words // 3)) for _ in range(3)
+            )
+        # Spread over a year in id order, as if added day by day
+        month = 1 + i * 12 // tasks
+        created_at = f"2024-{month:02d}-{1 + i % 28:02d} 09:00:00"
+        yield (
+            random_text(rng, rng.randint(2, 14)),
+            names[i % len(names)],
+            int(rng.random() < done_ratio),
+            notes,
+            created_at,
+            created_at if notes else None,
+        )
+
+
+def generate_database(
+    path,
+    tasks=10000,
+    categories=10,
+    note_length=200,
+    notes_ratio=0.2,
+    done_ratio=0.3,
+    seed=0,
+):
+    """Create (or extend) the database at path with synthetic tasks."""
+    db = Database(path)
+    try:
+        db.init_schema()
+        db.import_todos(
+            generate_rows(tasks, categories, note_length, notes_ratio, done_ratio, seed)
+        )
+    finally:
+        db.close()
+
+
+def add_arguments(parser):
+    parser.add_argument("--tasks", type=int, default=10000)
+    parser.add_argument("--categories", type=int, default=10)
+    parser.add_argument(
+        "--note-length", type=int, default=200, help="characters per note"
+    )
+    parser.add_argument(
+        "--notes-ratio", type=float, default=0.2, help="share of tasks with notes"
+    )
+    parser.add_argument("--done-ratio", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="database file to create")
+    add_arguments(parser)
+    args = parser.parse_args()
+    if os.path.exists(args.path):
+        parser.error(f"{args.path} already exists")
+    generate_database(
+        args.path,
+        args.tasks,
+        args.categories,
+        args.note_length,
+        args.notes_ratio,
+        args.done_ratio,
+        args.seed,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+"""Time HydroToDo's hot paths on a synthetic database and print JSON results.
+
+    python3 -m benchmarks.run --tasks 100000 --output results.json
+
+Every result holds the median, 95th percentile and minimum of its samples
+in its unit. Compare two result files with benchmarks.compare.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import hydrotodo
+from benchmarks import fake_curses
+from benchmarks.generate import add_arguments, generate_database
+
+GROUPS = ("startup", "load", "memory", "ops", "wrap", "editor", "render")
+
+
+def summarize(samples, unit="ms"):
+    samples = sorted(samples)
+    return {
+        "unit": unit,
+        "median": samples[len(samples) // 2],
+        "p95": samples[min(len(samples) - 1, len(samples) * 95 // 100)],
+        "min": samples[0],
+        "runs": len(samples),
+    }
+
+
+def elapsed_ms(start):
+    return (time.perf_counter() - start) * 1000
+
+
+def run_interface(db_path, script, height=40, width=120):
+    """Run main() headless on script; returns (start time, getch timestamps)."""
+    hydrotodo.curses = fake_curses
+    hydrotodo.close_db()
+    hydrotodo._db = hydrotodo.Database(db_path)
+    stdscr = fake_curses.start(script, height, width)
+    start = time.perf_counter()
+    try:
+        hydrotodo.main(stdscr)
+    finally:
+        hydrotodo.close_db()
+    return start, list(fake_curses.marks)
+
+
+def frame_times(marks):
+    """Time spent handling each key: from one blocking getch() to the next."""
+    return [(b - a) * 1000 for a, b in zip(marks, marks[1:])]
+
+
+def bench_startup(db_path, args):
+    results = {}
+    samples = []
+    for _ in range(args.repeat):
+        start, marks = run_interface(db_path, ["q"], args.height, args.width)
+        samples.append((marks[0] - start) * 1000)
+    results["startup.first_frame"] = summarize(samples)
+
+    # The CLI finds its database under $HOME, so point one at ours
+    home = tempfile.mkdtemp(prefix="hydrotodo-home-")
+    try:
+        os.symlink(os.path.abspath(db_path), os.path.join(home, ".hydrotodo.db"))
+        env = dict(os.environ, HOME=home)
+        command = [sys.executable, hydrotodo.__file__, "ls", "-c", "-benchmark-"]
+        samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL)
+            samples.append(elapsed_ms(start))
+        results["startup.cli_ls"] = summarize(samples)
+    finally:
+        shutil.rmtree(home)
+    return results
+
+
+def bench_load(db, categories, args):
+    load, first_page = [], []
+    for i in range(args.repeat):
+        category = categories[i % len(categories)]
+        start = time.perf_counter()
+        db.load_todos(category)
+        load.append(elapsed_ms(start))
+
+        store = hydrotodo.TaskStore(db)
+        start = time.perf_counter()
+        todos = store.todos(category)
+        store.focus(category, 0)
+        if len(todos):
+            todos[0]
+        first_page.append(elapsed_ms(start))
+
+    # Switching a tab to another view and showing its first page
+    switch = []
+    store = hydrotodo.TaskStore(db)
+    for i in range(args.repeat):
+        category = categories[i % len(categories)]
+        view = hydrotodo.VIEW_NAMES[i % len(hydrotodo.VIEW_NAMES)]
+        start = time.perf_counter()
+        store.set_view(category, view)
+        todos = store.todos(category)
+        store.focus(category, 0)
+        if len(todos):
+            todos[0]
+        switch.append(elapsed_ms(start))
+    return {
+        "load.load_todos": summarize(load),
+        "load.task_list_first_page": summarize(first_page),
+        "load.view_switch": summarize(switch),
+    }
+
+
+def bench_memory(db, categories, args):
+    """Python heap held by loaded task rows, per row."""
+    loaded, paged = [], []
+    tracemalloc.start()
+    try:
+        for category in categories:
+            before = tracemalloc.get_traced_memory()[0]
+            todos = db.load_todos(category)
+            if todos:
+                loaded.append(
+                    (tracemalloc.get_traced_memory()[0] - before) / len(todos)
+                )
+            del todos
+
+            # What a tab keeps in memory: the pages around the cursor
+            before = tracemalloc.get_traced_memory()[0]
+            store = hydrotodo.TaskStore(db)
+            todos = store.todos(category)
+            store.focus(category, len(todos) // 2)
+            if todos.cached_rows:
+                paged.append(
+                    (tracemalloc.get_traced_memory()[0] - before) / todos.cached_rows
+                )
+            del store, todos
+    finally:
+        tracemalloc.stop()
+    return {
+        "memory.load_todos_per_row": summarize(loaded, "bytes"),
+        "memory.task_list_per_row": summarize(paged, "bytes"),
+    }
+
+
+def bench_ops(db, category, args):
+    store = hydrotodo.TaskStore(db)
+    todos = store.todos(category)
+    middle = len(todos) // 2
+    store.focus(category, middle)
+    toggle, add, delete = [], [], []
+    for _ in range(args.repeat):
+        # Toggled twice so the database ends up as it was
+        for _ in range(2):
+            start = time.perf_counter()
+            store.toggle(category, middle)
+            toggle.append(elapsed_ms(start))
+        start = time.perf_counter()
+        _, index = store.add(category, "benchmark task")
+        add.append(elapsed_ms(start))
+        start = time.perf_counter()
+        store.delete(category, index)
+        delete.append(elapsed_ms(start))
+
+    # As the interface does it: queued for the background writer
+    writer = hydrotodo.WriteQueue(db.path)
+    try:
+        store = hydrotodo.TaskStore(db, writer=writer)
+        store.focus(category, middle)
+        queued = []
+        for _ in range(args.repeat * 2):
+            start = time.perf_counter()
+            store.toggle(category, middle)
+            queued.append(elapsed_ms(start))
+    finally:
+        writer.close()
+    return {
+        "ops.toggle": summarize(toggle),
+        "ops.toggle_queued": summarize(queued),
+        "ops.add": summarize(add),
+        "ops.delete": summarize(delete),
+    }
+
+
+def sample_notes(db, count=500):
+    return [
+        row[0]
+        for row in db.conn.execute(
+            "SELECT notes FROM todos WHERE notes != '' LIMIT ?", (count,)
+        )
+    ]
+
+
+def bench_wrap(texts, args):
+    width = 40  # narrow enough that most notes need wrapping
+    chars = sum(len(text) for text in texts)
+    wrap, cached = [], []
+    cache = hydrotodo.WrapCache(max_entries=len(texts))
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        for text in texts:
+            hydrotodo.wrap_text(text, width)
+        wrap.append(chars / 1e6 / (time.perf_counter() - start))
+        start = time.perf_counter()
+        for i, text in enumerate(texts):
+            cache.wrap(i, text, text, width)
+        cached.append(chars / 1e6 / (time.perf_counter() - start))
+    return {
+        "wrap.wrap_text": summarize(wrap, "Mchars/s"),
+        "wrap.wrap_cache": summarize(cached, "Mchars/s"),
+    }
+
+
+def bench_editor(texts, args):
+    hydrotodo.curses = fake_curses
+    text = "\n".join(texts[:20])
+    # A typed character followed by a cursor key, so keys are not merged
+    # into one paste
+    script = []
+    for _ in range(args.repeat):
+        script += ["x", fake_curses.KEY_LEFT, fake_curses.KEY_RIGHT]
+    script.append(6)  # Ctrl+F saves
+    stdscr = fake_curses.start(script, args.height, args.width)
+    hydrotodo.edit_multiline_text(stdscr, 2, 2, args.width - 4, args.height - 6, text)
+    keystroke = frame_times(fake_curses.marks)
+
+    paste = []
+    for _ in range(args.repeat):
+        stdscr = fake_curses.start(["p" * 2000, 6], args.height, args.width)
+        hydrotodo.edit_multiline_text(
+            stdscr, 2, 2, args.width - 4, args.height - 6, text
+        )
+        paste.append(frame_times(fake_curses.marks)[0])
+    return {
+        "editor.keystroke": summarize(keystroke),
+        "editor.paste_2000": summarize(paste),
+    }
+
+
+def bench_render(db_path, args):
+    # ↓ and Ctrl+N alternate, so repeats are not merged into one frame
+    script = [fake_curses.KEY_DOWN, 14] * (args.repeat // 2 + 1)
+    _, marks = run_interface(db_path, script + ["q"], args.height, args.width)
+    scroll = frame_times(marks)
+    switch = [fake_curses.KEY_RIGHT, fake_curses.KEY_LEFT] * (args.repeat // 2 + 1)
+    _, marks = run_interface(db_path, switch + ["q"], args.height, args.width)
+    tabs = frame_times(marks)
+
+    # A held-down ↓ whose repeats piled up: from the first key to idle
+    held = []
+    for _ in range(max(1, args.repeat // 10)):
+        _, marks = run_interface(
+            db_path, [fake_curses.KEY_DOWN] * 1000 + ["q"], args.height, args.width
+        )
+        held.append((marks[1] - marks[0]) * 1000)
+    return {
+        "render.scroll_frame": summarize(scroll),
+        "render.tab_switch_frame": summarize(tabs),
+        "render.held_key_1000": summarize(held),
+    }
+
+
+def describe_commit():
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=os.path.dirname(os.path.abspath(hydrotodo.__file__)),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+        ).stdout.strip()
+    except OSError:
+        return None
+
+
+def run(db_path, args):
+    groups = args.only or GROUPS
+    results = {}
+    if "startup" in groups:
+        results.update(bench_startup(db_path, args))
+    db = hydrotodo.Database(db_path)
+    try:
+        categories = db.get_all_categories()
+        texts = sample_notes(db)
+        if "load" in groups:
+            results.update(bench_load(db, categories, args))
+        if "memory" in groups:
+            results.update(bench_memory(db, categories, args))
+        if "ops" in groups:
+            results.update(bench_ops(db, categories[0], args))
+        if "wrap" in groups and texts:
+            results.update(bench_wrap(texts, args))
+        if "editor" in groups:
+            results.update(bench_editor(texts or ["benchmark"], args))
+    finally:
+        db.close()
+    if "render" in groups:
+        results.update(bench_render(db_path, args))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    parser.add_argument(
+        "--db",
+        help="benchmark this database instead of generating one"
+        " (tasks are toggled and added, then restored)",
+    )
+    parser.add_argument("--repeat", type=int, default=50, help="samples per result")
+    parser.add_argument("--height", type=int, default=40)
+    parser.add_argument("--width", type=int, default=120)
+    parser.add_argument("--only", nargs="+", choices=GROUPS)
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    workdir = None
+    try:
+        if args.db:
+            db_path = args.db
+        else:
+            workdir = tempfile.mkdtemp(prefix="hydrotodo-bench-")
+            db_path = os.path.join(workdir, "bench.db")
+            start = time.perf_counter()
+            generate_database(
+                db_path,
+                args.tasks,
+                args.categories,
+                args.note_length,
+                args.notes_ratio,
+                args.done_ratio,
+                args.seed,
+            )
+            print(f"generated in {elapsed_ms(start) / 1000:.1f}s", file=sys.stderr)
+        results = run(db_path, args)
+    finally:
+        if workdir is not None:
+            shutil.rmtree(workdir)
+
+    report = {
+        "commit": describe_commit(),
+        "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "params": {
+            name: getattr(args, name)
+            for name in (
+                "tasks",
+                "categories",
+                "note_length",
+                "notes_ratio",
+                "done_ratio",
+                "seed",
+                "repeat",
+                "height",
+                "width",
+            )
+        },
+        "database": args.db,
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,20 @@
 #!usr/bin/env/python3
 
-import curses
+import atexit
 import sqlite3
 import os
-from datetime import datetime
+import heapq
+import select
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from itertools import islice
+
+# curses is imported by run_tui(), so the command line interface starts
+# without loading or initializing it
+curses = None
 
 # HydroToDo Stable
 # Character for separator
@@ -22,9 +33,57 @@ ASCII_TITLE = [
 ]
 
 
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+# Columns of list queries; notes are fetched separately for the selected task
+TODO_COLUMNS = "id, text, done, created_at, note_updated_at"
+
+
+class Todo:
+    """One task row.
+
+    Slots take the record itself from 184 bytes (a dict) to 80. Fields are
+    still read and written by name, todo["text"], like the dicts this
+    replaced.
+    """
+
+    __slots__ = ("id", "text", "done", "created_at", "note_updated_at", "category")
+
+    def __init__(self, todo_id, text, done, created_at, note_updated_at, category=None):
+        self.id = todo_id
+        self.text = text
+        self.done = done
+        self.created_at = created_at
+        self.note_updated_at = note_updated_at
+        self.category = category
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def __repr__(self):
+        return f"Todo({self.id!r}, {self.text!r}, done={self.done!r})"
+
+
+def row_to_todo(row):
+    # Timestamps repeat (imports, bursts of adds), so equal ones share a string
+    created_at, note_updated_at = row[3], row[4]
+    return Todo(
+        row[0],
+        row[1],
+        bool(row[2]),
+        sys.intern(created_at) if created_at else created_at,
+        sys.intern(note_updated_at) if note_updated_at else note_updated_at,
+    )
+
+
+def migrate_base_schema(c):
     c.execute(
         """CREATE TABLE IF NOT EXISTS todos (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -41,6 +100,7 @@ def init_db():
                     name TEXT PRIMARY KEY
                 )"""
     )
+    # Databases created before schema versioning may lack later columns
     c.execute("PRAGMA table_info(todos)")
     columns = [row[1] for row in c.fetchall()]
     if "category" not in columns:
@@ -53,299 +113,3194 @@ def init_db():
         c.execute("ALTER TABLE todos ADD COLUMN created_at TEXT")
     if "note_updated_at" not in columns:
         c.execute("ALTER TABLE todos ADD COLUMN note_updated_at TEXT")
-    conn.commit()
-    conn.close()
 
 
-def load_todos(category="General"):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+def migrate_category_indexes(c):
+    # Covers the per-category count, keyset pages and DISTINCT category scan
     c.execute(
-        "SELECT id, text, done, notes, created_at, note_updated_at FROM todos WHERE category = ?",
-        (category,),
-    )
-    todos = [
-        {
-            "id": row[0],
-            "text": row[1],
-            "done": bool(row[2]),
-            "notes": row[3],
-            "created_at": row[4],
-            "note_updated_at": row[5],
-        }
-        for row in c.fetchall()
-    ]
-    conn.close()
-    return todos
+        "CREATE INDEX IF NOT EXISTS idx_todos_category_id ON todos (category, id)"
+    )
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_todos_category_done ON todos (category, done)"
+    )
+
+
+def migrate_full_text_search(c):
+    # Builds without FTS5 skip the index; search then falls back to LIKE
+    if ("ENABLE_FTS5",) not in c.execute("PRAGMA compile_options").fetchall():
+        return
+    c.execute(
+        """CREATE VIRTUAL TABLE IF NOT EXISTS todos_fts USING fts5(
+                    text, notes, content='todos', content_rowid='id'
+                )"""
+    )
+    c.execute(
+        """CREATE TRIGGER IF NOT EXISTS todos_fts_insert AFTER INSERT ON todos BEGIN
+                    INSERT INTO todos_fts (rowid, text, notes)
+                    VALUES (new.id, new.text, new.notes);
+                END"""
+    )
+    c.execute(
+        """CREATE TRIGGER IF NOT EXISTS todos_fts_delete AFTER DELETE ON todos BEGIN
+                    INSERT INTO todos_fts (todos_fts, rowid, text, notes)
+                    VALUES ('delete', old.id, old.text, old.notes);
+                END"""
+    )
+    c.execute(
+        """CREATE TRIGGER IF NOT EXISTS todos_fts_update
+                AFTER UPDATE OF text, notes ON todos BEGIN
+                    INSERT INTO todos_fts (todos_fts, rowid, text, notes)
+                    VALUES ('delete', old.id, old.text, old.notes);
+                    INSERT INTO todos_fts (rowid, text, notes)
+                    VALUES (new.id, new.text, new.notes);
+                END"""
+    )
+    c.execute("INSERT INTO todos_fts (todos_fts) VALUES ('rebuild')")
+
+
+# Appends a category at the end of the tab order
+NEXT_CATEGORY_POSITION = "(SELECT IFNULL(MAX(position), 0) + 1 FROM categories)"
+
+
+def migrate_categories(c):
+    # Every category with its tab position and task counts, so listing tabs
+    # and their done/total badges never scans todos. Closed tabs stay listed
+    # in deleted_categories and are filtered out when reading.
+    c.execute(
+        """CREATE TABLE IF NOT EXISTS categories (
+                    name TEXT PRIMARY KEY,
+                    position INTEGER NOT NULL,
+                    total INTEGER NOT NULL DEFAULT 0,
+                    done INTEGER NOT NULL DEFAULT 0
+                )"""
+    )
+    c.execute(
+        "SELECT category, COUNT(*), SUM(done) FROM todos"
+        " GROUP BY category ORDER BY MIN(id)"
+    )
+    c.executemany(
+        "INSERT OR IGNORE INTO categories (name, position, total, done)"
+        " VALUES (?, ?, ?, ?)",
+        [
+            (name, position, total, done)
+            for position, (name, total, done) in enumerate(c.fetchall(), 1)
+        ],
+    )
+    c.execute(
+        f"""CREATE TRIGGER IF NOT EXISTS categories_insert AFTER INSERT ON todos BEGIN
+                    INSERT OR IGNORE INTO categories (name, position)
+                    VALUES (new.category, {NEXT_CATEGORY_POSITION});
+                    UPDATE categories SET total = total + 1, done = done + new.done
+                    WHERE name = new.category;
+                END"""
+    )
+    c.execute(
+        """CREATE TRIGGER IF NOT EXISTS categories_delete AFTER DELETE ON todos BEGIN
+                    UPDATE categories SET total = total - 1, done = done - old.done
+                    WHERE name = old.category;
+                END"""
+    )
+    c.execute(
+        f"""CREATE TRIGGER IF NOT EXISTS categories_update
+                AFTER UPDATE OF done, category ON todos BEGIN
+                    UPDATE categories SET total = total - 1, done = done - old.done
+                    WHERE name = old.category;
+                    INSERT OR IGNORE INTO categories (name, position)
+                    VALUES (new.category, {NEXT_CATEGORY_POSITION});
+                    UPDATE categories SET total = total + 1, done = done + new.done
+                    WHERE name = new.category;
+                END"""
+    )
+
+
+# Entries kept in the change log; a reader further behind reloads everything
+CHANGE_LOG_SIZE = 10000
+
+
+def migrate_change_log(c):
+    # Every commit that changes what a tab shows leaves a note here, so other
+    # running instances can refresh just that: "task" for one task edited in
+    # place, "list" for tasks added to or removed from a category, and "tab"
+    # for categories created, closed or reopened. Tasks purged from closed
+    # tabs are not logged.
+    c.execute(
+        """CREATE TABLE IF NOT EXISTS changes (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    what TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    todo_id INTEGER
+                )"""
+    )
+    c.execute(
+        """CREATE TRIGGER IF NOT EXISTS changes_todo_insert AFTER INSERT ON todos BEGIN
+                    INSERT INTO changes (what, category) VALUES ('list', new.category);
+                END"""
+    )
+    c.execute(
+        """CREATE TRIGGER IF NOT EXISTS changes_todo_delete AFTER DELETE ON todos
+                WHEN old.category NOT IN (SELECT name FROM deleted_categories) BEGIN
+                    INSERT INTO changes (what, category) VALUES ('list', old.category);
+                END"""
+    )
+    c.execute(
+        """CREATE TRIGGER IF NOT EXISTS changes_todo_update AFTER UPDATE ON todos
+                WHEN new.category = old.category BEGIN
+                    INSERT INTO changes (what, category, todo_id)
+                    VALUES ('task', new.category, new.id);
+                END"""
+    )
+    c.execute(
+        """CREATE TRIGGER IF NOT EXISTS changes_todo_move
+                AFTER UPDATE OF category ON todos
+                WHEN new.category != old.category BEGIN
+                    INSERT INTO changes (what, category) VALUES ('list', old.category);
+                    INSERT INTO changes (what, category) VALUES ('list', new.category);
+                END"""
+    )
+    for table, name, event in (
+        ("categories", "name", "INSERT"),
+        ("categories", "name", "DELETE"),
+        ("deleted_categories", "name", "INSERT"),
+        ("deleted_categories", "name", "DELETE"),
+    ):
+        row = "old" if event == "DELETE" else "new"
+        c.execute(
+            f"""CREATE TRIGGER IF NOT EXISTS changes_{table}_{event.lower()}
+                    AFTER {event} ON {table} BEGIN
+                        INSERT INTO changes (what, category) VALUES ('tab', {row}.{name});
+                    END"""
+        )
+    c.execute(
+        f"""CREATE TRIGGER IF NOT EXISTS changes_prune AFTER INSERT ON changes
+                WHEN new.seq % 1000 = 0 BEGIN
+                    DELETE FROM changes WHERE seq <= new.seq - {CHANGE_LOG_SIZE};
+                END"""
+    )
+
+
+def migrate_archive(c):
+    # Done tasks are moved here once they are old enough, so todos, which
+    # every tab reads, only grows with live work. done_at records when a task
+    # was completed; tasks done before it existed fall back to created_at.
+    columns = [row[1] for row in c.execute("PRAGMA table_info(todos)").fetchall()]
+    if "done_at" not in columns:
+        c.execute("ALTER TABLE todos ADD COLUMN done_at TEXT")
+    c.execute(
+        """CREATE TABLE IF NOT EXISTS archive (
+                    id INTEGER PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    done INTEGER NOT NULL,
+                    category TEXT NOT NULL,
+                    notes TEXT NOT NULL DEFAULT '',
+                    created_at TEXT,
+                    note_updated_at TEXT,
+                    done_at TEXT,
+                    archived_at TEXT
+                )"""
+    )
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_archive_category_id ON archive (category, id)"
+    )
 
 
-def add_todo(text, category="General"):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+def migrate_note_index(c):
+    # Serves the "recently noted" view; tasks without notes are left out
     c.execute(
-        "INSERT INTO todos (text, done, category, created_at) VALUES (?, 0, ?, ?)",
-        (text, category, created_at),
+        "CREATE INDEX IF NOT EXISTS idx_todos_category_noted"
+        " ON todos (category, note_updated_at) WHERE note_updated_at IS NOT NULL"
     )
-    conn.commit()
-    conn.close()
 
 
-def update_todo_done(todo_id, done):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("UPDATE todos SET done = ? WHERE id = ?", (int(done), todo_id))
-    conn.commit()
-    conn.close()
+def migrate_created_index(c):
+    # Serves the "newest first" view, ordered by creation time. Tasks from
+    # before created_at existed get an empty one, sorting them oldest, since
+    # a NULL would break paging on (created_at, id)
+    c.execute("UPDATE todos SET created_at = '' WHERE created_at IS NULL")
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_todos_category_created"
+        " ON todos (category, created_at)"
+    )
 
 
-def delete_todo(todo_id):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("DELETE FROM todos WHERE id = ?", (todo_id,))
-    conn.commit()
-    conn.close()
+def not_purged(table="todos"):
+    """SQL condition leaving out the rows of table a closed tab left to purge."""
+    return (
+        f"{table}.id > IFNULL((SELECT up_to FROM purges"
+        f" WHERE purges.category = {table}.category), 0)"
+    )
 
 
-def update_todo_notes(todo_id, notes):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    note_updated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+def migrate_purge_watermarks(c):
+    # Closing a tab records the highest task id at that moment: its tasks up
+    # to there are gone for every reader and wait for Purger, even if a tab
+    # of the same name is opened again meanwhile. They no longer count in
+    # categories, nor are their deletes logged as changes.
     c.execute(
-        "UPDATE todos SET notes = ?, note_updated_at = ? WHERE id = ?",
-        (notes, note_updated_at, todo_id),
+        """CREATE TABLE IF NOT EXISTS purges (
+                    category TEXT PRIMARY KEY,
+                    up_to INTEGER NOT NULL
+                )"""
+    )
+    c.execute(
+        "INSERT OR IGNORE INTO purges (category, up_to)"
+        " SELECT name, (SELECT IFNULL(MAX(id), 0) FROM todos)"
+        " FROM deleted_categories WHERE name IN (SELECT name FROM categories)"
+    )
+    c.execute(
+        "UPDATE categories SET total = 0, done = 0"
+        " WHERE name IN (SELECT category FROM purges)"
+    )
+    for trigger in ("categories_delete", "categories_update", "changes_todo_delete"):
+        c.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    c.execute(
+        f"""CREATE TRIGGER categories_delete AFTER DELETE ON todos
+                WHEN {not_purged("old")} BEGIN
+                    UPDATE categories SET total = total - 1, done = done - old.done
+                    WHERE name = old.category;
+                END"""
+    )
+    c.execute(
+        f"""CREATE TRIGGER categories_update
+                AFTER UPDATE OF done, category ON todos
+                WHEN {not_purged("old")} BEGIN
+                    UPDATE categories SET total = total - 1, done = done - old.done
+                    WHERE name = old.category;
+                    INSERT OR IGNORE INTO categories (name, position)
+                    VALUES (new.category, {NEXT_CATEGORY_POSITION});
+                    UPDATE categories SET total = total + 1, done = done + new.done
+                    WHERE name = new.category;
+                END"""
+    )
+    c.execute(
+        f"""CREATE TRIGGER changes_todo_delete AFTER DELETE ON todos
+                WHEN {not_purged("old")} BEGIN
+                    INSERT INTO changes (what, category) VALUES ('list', old.category);
+                END"""
+    )
+
+
+# Schema migrations, applied in order; PRAGMA user_version holds how many have run
+MIGRATIONS = [
+    migrate_base_schema,
+    migrate_category_indexes,
+    migrate_full_text_search,
+    migrate_categories,
+    migrate_change_log,
+    migrate_archive,
+    migrate_note_index,
+    migrate_created_index,
+    migrate_purge_watermarks,
+]
+
+# Tasks Database.archive_done moves: done before the cutoff (the parameter),
+# and not left by a closed tab to be purged
+ARCHIVABLE = (
+    f"done = 1 AND COALESCE(done_at, NULLIF(created_at, '')) < ? AND {not_purged()}"
+)
+
+# Per-row triggers import_todos replaces with one catch-up statement each
+BULK_INSERT_TRIGGERS = ("todos_fts_insert", "categories_insert", "changes_todo_insert")
+
+# Search results are marked up with these around every matched term
+HIGHLIGHT_START = "\x01"
+HIGHLIGHT_END = "\x02"
+
+SEARCH_SQL = """
+    SELECT t.id, t.category, t.done,
+           highlight(todos_fts, 0, char(1), char(2)),
+           snippet(todos_fts, 1, char(1), char(2), '…', 12)
+    FROM todos_fts JOIN todos AS t ON t.id = todos_fts.rowid
+    WHERE todos_fts MATCH ?
+      AND {}
+    ORDER BY rank
+    LIMIT ?
+""".format(
+    not_purged("t")
+)
+
+SEARCH_LIKE_SQL = """
+    SELECT id, category, done, text, ''
+    FROM todos
+    WHERE (text LIKE ? ESCAPE '\\' OR notes LIKE ? ESCAPE '\\')
+      AND {}
+    ORDER BY id DESC
+    LIMIT ?
+""".format(
+    not_purged()
+)
+
+
+def like_pattern(text):
+    """LIKE pattern (with ESCAPE '\\') matching text anywhere, literally."""
+    return "%{}%".format(
+        text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
     )
-    conn.commit()
-    conn.close()
 
 
-def add_deleted_category(cat):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("INSERT OR IGNORE INTO deleted_categories (name) VALUES (?)", (cat,))
-    conn.commit()
-    conn.close()
+def fts_query(text):
+    """Turn typed words into an FTS5 query matching all of them as prefixes."""
+    return " ".join('"{}"*'.format(word.replace('"', '""')) for word in text.split())
+
+
+def env_int(name, default):
+    """A whole number >= 0 from the environment, or default if unset or invalid.
+
+    Read at import time, so a bad value is reported rather than raised:
+    it must not stop commands that never use the setting.
+    """
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        number = -1
+    if number < 0:
+        print(
+            f"hydrotodo: ignoring {name}={value!r}, not a whole number >= 0;"
+            f" using {default}",
+            file=sys.stderr,
+        )
+        return default
+    return number
+
+
+def env_choice(name, choices, default):
+    """One of choices (case-insensitive) from the environment, or default.
+
+    Like env_int, an invalid value is reported on stderr and ignored.
+    """
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    if value.upper() not in choices:
+        print(
+            f"hydrotodo: ignoring {name}={value!r}, not one of"
+            f" {', '.join(choices)}; using {default}",
+            file=sys.stderr,
+        )
+        return default
+    return value.upper()
+
+
+SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+# WAL + NORMAL only fsyncs on checkpoints, which keeps every keypress cheap
+DB_SYNCHRONOUS = env_choice("HYDROTODO_SYNCHRONOUS", SYNCHRONOUS_LEVELS, "NORMAL")
+# Seconds a connection waits for another writer to release the database
+# (SQLite's busy timeout). Background writers then retry WRITE_RETRIES times,
+# sleeping BUSY_RETRY_PAUSE seconds longer each time; the interface thread
+# reports the database as busy instead.
+BUSY_TIMEOUT = 5.0
+WRITE_RETRIES = 3
+BUSY_RETRY_PAUSE = 0.5
+# Seconds the interface waits for queued writes before reading without them
+# (and reporting the database as busy) rather than freezing
+FLUSH_TIMEOUT = 0.5
+# How often an idle interface looks for changes made by other instances
+IDLE_POLL_MS = 1000
+# Shortest time between two frames while a navigation key is held down;
+# repeats arriving sooner are applied together and drawn once
+MIN_FRAME_MS = 16
+# Rows kept in memory across inactive tabs before the least recently shown are evicted
+TASK_CACHE_ROWS = env_int("HYDROTODO_CACHE_ROWS", 50000)
+# Rows fetched per keyset page by the virtualized task list
+PAGE_SIZE = 200
+# Wrapped texts remembered by the layout cache
+WRAP_CACHE_SIZE = 4096
+# Notes of recently selected tasks kept in memory
+NOTES_CACHE_SIZE = 32
+# Search-as-you-type: results shown, idle time before querying, and how many
+# SQLite VM steps run between checks for a newer keystroke
+SEARCH_LIMIT = 50
+SEARCH_DEBOUNCE_MS = 60
+SEARCH_PROGRESS_STEPS = 1000
+# Fuzzy finder: results kept, candidates scored between result updates and
+# how often the UI polls for new results while it is open
+FUZZY_LIMIT = 50
+FUZZY_CHUNK = 2000
+FUZZY_POLL_MS = 50
+
+# Rows per executemany call when bulk importing
+IMPORT_BATCH_SIZE = 10000
+# Closed tabs are emptied PURGE_CHUNK rows per transaction, pausing
+# PURGE_PAUSE seconds between transactions so other writers get the lock
+PURGE_CHUNK = 500
+PURGE_PAUSE = 0.005
+# Rows per fetchmany call when exporting
+EXPORT_BATCH_SIZE = 1000
+# Done tasks are archived this many days after completion when the
+# interface starts (0 never archives automatically), ARCHIVE_CHUNK rows per
+# transaction; the archive view lists at most ARCHIVE_VIEW_LIMIT of them
+ARCHIVE_AFTER_DAYS = env_int("HYDROTODO_ARCHIVE_DAYS", 0)
+ARCHIVE_CHUNK = 500
+ARCHIVE_VIEW_LIMIT = 200
+# Writes waiting for the background writer before the interface has to wait
+WRITE_QUEUE_SIZE = 1000
+
+# Profiling is off unless HYDROTODO_PROFILE is set (or --profile is passed):
+# "1" writes the trace to PROFILE_PATH, anything else is taken as the path
+PROFILE_PATH = os.path.join(os.path.expanduser("~"), ".hydrotodo-trace.jsonl")
+PROFILE = os.environ.get("HYDROTODO_PROFILE", "")
+# The trace rolls over to <path>.1 at this size, so it can stay on
+TRACE_MAX_BYTES = 5 * 1024 * 1024
+TRACE_FLUSH_SECONDS = 1.0
+
+
+# Ways a tab can list its tasks, cycled with 'v'. Each has a label, an extra
+# SQL condition on the category's rows, the sort columns (ending in id, so
+# the order is total and can be paged by keyset), the sort direction, the
+# categories column its count is kept in (None to count rows), and the
+# condition again as a test on a loaded Todo. Every one is served by an index.
+TASK_VIEWS = {
+    "all": {
+        "label": "All tasks",
+        "where": "",
+        "order": ("id",),
+        "descending": False,
+        "count": "total",
+        "test": lambda todo: True,
+    },
+    "pending": {
+        "label": "Pending",
+        "where": "done = 0",
+        "order": ("id",),
+        "descending": False,
+        "count": "total - done",
+        "test": lambda todo: not todo["done"],
+    },
+    "done": {
+        "label": "Done",
+        "where": "done = 1",
+        "order": ("id",),
+        "descending": False,
+        "count": "done",
+        "test": lambda todo: bool(todo["done"]),
+    },
+    "newest": {
+        "label": "Newest first",
+        "where": "",
+        "order": ("created_at", "id"),
+        "descending": True,
+        "count": "total",
+        "test": lambda todo: True,
+    },
+    "noted": {
+        "label": "Recently noted",
+        "where": "note_updated_at IS NOT NULL",
+        "order": ("note_updated_at", "id"),
+        "descending": True,
+        "count": None,
+        "test": lambda todo: todo["note_updated_at"] is not None,
+    },
+}
+VIEW_NAMES = tuple(TASK_VIEWS)
+
+
+def view_queries(view):
+    """The paging and counting statements of one TASK_VIEWS entry.
+
+    Pages continue from the sort key of a loaded row, compared as a row
+    value so the view's index can seek straight to it.
+    """
+    where = f"category = ? AND {not_purged()}"
+    if view["where"]:
+        where += f" AND {view['where']}"
+    key = ", ".join(view["order"])
+    placeholders = ", ".join("?" * len(view["order"]))
+    if len(view["order"]) > 1:
+        key, placeholders = f"({key})", f"({placeholders})"
+    forward, backward = ("DESC", "ASC") if view["descending"] else ("ASC", "DESC")
+    later, earlier = ("<", ">") if view["descending"] else (">", "<")
+    select = f"SELECT {TODO_COLUMNS} FROM todos WHERE {where}"
+
+    def order(direction):
+        return ", ".join(f"{column} {direction}" for column in view["order"])
+
+    if view["count"] is not None:
+        count = f"SELECT {view['count']} FROM categories WHERE name = ?"
+    else:
+        count = f"SELECT COUNT(*) FROM todos WHERE {where}"
+    return {
+        "after": f"{select} AND {key} {later} {placeholders}"
+        f" ORDER BY {order(forward)} LIMIT ?",
+        "before": f"{select} AND {key} {earlier} {placeholders}"
+        f" ORDER BY {order(backward)} LIMIT ?",
+        "offset": f"{select} ORDER BY {order(forward)} LIMIT ? OFFSET ?",
+        "count": count,
+        "key": f"SELECT {', '.join(view['order'])} FROM todos WHERE id = ? AND {where}",
+        "count_before": f"SELECT COUNT(*) FROM todos"
+        f" WHERE {where} AND {key} {earlier} {placeholders}",
+    }
+
+
+VIEW_SQL = {name: view_queries(view) for name, view in TASK_VIEWS.items()}
+
+# Task mutations, shared by Database and the write-behind WriteQueue
+ADD_TODO_SQL = (
+    "INSERT INTO todos (text, done, category, created_at) VALUES (?, 0, ?, ?)"
+)
+SET_DONE_SQL = (
+    "UPDATE todos SET done = ?1,"
+    " done_at = CASE WHEN ?1 THEN datetime('now', 'localtime') END WHERE id = ?2"
+)
+DELETE_TODO_SQL = "DELETE FROM todos WHERE id = ?"
+SET_NOTES_SQL = "UPDATE todos SET notes = ?, note_updated_at = ? WHERE id = ?"
+
+
+class Database:
+    """Long-lived SQLite connection shared by the whole session.
+
+    The connection is opened once, switched to WAL journaling and keeps its
+    prepared statements in the sqlite3 statement cache, so each operation
+    below only pays for executing an already compiled statement.
+    """
+
+    def __init__(
+        self,
+        path=DB_PATH,
+        synchronous=DB_SYNCHRONOUS,
+        cached_statements=64,
+        timeout=BUSY_TIMEOUT,
+    ):
+        if synchronous not in SYNCHRONOUS_LEVELS:
+            raise ValueError(
+                f"synchronous must be one of {', '.join(SYNCHRONOUS_LEVELS)}, got {synchronous!r}"
+            )
+        self.path = path
+        self._has_fts = None
+        self.conn = sqlite3.connect(
+            path, timeout=timeout, cached_statements=cached_statements
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(f"PRAGMA synchronous={synchronous}")
+
+    def close(self):
+        self.conn.close()
+
+    def init_schema(self):
+        """Bring the schema up to date, running only the migrations not yet applied."""
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= len(MIGRATIONS):
+            return
+        c = self.conn.cursor()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            for migration in MIGRATIONS[version:]:
+                migration(c)
+            c.execute(f"PRAGMA user_version = {len(MIGRATIONS)}")
+        except BaseException:
+            self.conn.rollback()
+            raise
+        self.conn.commit()
+
+    def has_fts(self):
+        if self._has_fts is None:
+            self._has_fts = (
+                self.conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'todos_fts'"
+                ).fetchone()
+                is not None
+            )
+        return self._has_fts
+
+    def search(self, query, limit=SEARCH_LIMIT, cancel=None):
+        """Best matches for query in task text and notes across all categories.
+
+        Titles and note snippets come back marked up with HIGHLIGHT_START and
+        HIGHLIGHT_END. cancel, when given, is polled while SQLite works and
+        aborts the query (sqlite3.OperationalError) by returning True.
+        """
+        if not query.strip():
+            return []
+        if cancel is not None:
+            self.conn.set_progress_handler(cancel, SEARCH_PROGRESS_STEPS)
+        try:
+            if self.has_fts():
+                c = self.conn.execute(SEARCH_SQL, (fts_query(query), limit))
+            else:
+                pattern = like_pattern(query)
+                c = self.conn.execute(SEARCH_LIKE_SQL, (pattern, pattern, limit))
+            rows = c.fetchall()
+        finally:
+            if cancel is not None:
+                self.conn.set_progress_handler(None, 0)
+        return [
+            {
+                "id": row[0],
+                "category": row[1],
+                "done": bool(row[2]),
+                "text": row[3],
+                "snippet": row[4],
+            }
+            for row in rows
+        ]
+
+    def data_version(self):
+        """Counter that changes whenever another connection commits."""
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def last_change(self):
+        return self.conn.execute("SELECT IFNULL(MAX(seq), 0) FROM changes").fetchone()[
+            0
+        ]
+
+    def changes_since(self, seq):
+        """(seq, what, category, todo_id) logged after seq, oldest first.
+
+        Returns None when entries after seq have already been pruned, as the
+        sequence has no gaps otherwise.
+        """
+        rows = self.conn.execute(
+            "SELECT seq, what, category, todo_id FROM changes WHERE seq > ? ORDER BY seq",
+            (seq,),
+        ).fetchall()
+        if rows and rows[0][0] != seq + 1:
+            return None
+        return rows
+
+    def load_todos(self, category="General"):
+        c = self.conn.execute(
+            f"SELECT {TODO_COLUMNS} FROM todos"
+            f" WHERE category = ? AND {not_purged()} ORDER BY id",
+            (category,),
+        )
+        return [row_to_todo(row) for row in c.fetchall()]
+
+    def get_todo(self, todo_id):
+        row = self.conn.execute(
+            f"SELECT {TODO_COLUMNS} FROM todos WHERE id = ?", (todo_id,)
+        ).fetchone()
+        return row_to_todo(row) if row else None
+
+    @staticmethod
+    def _filter(category=None, done=None, since=None, until=None):
+        """WHERE clause and parameters for the listing and export queries.
+
+        category=None covers every category not closed as a tab, and tasks
+        a closed tab left to purge are never included; done
+        restricts to completed (True) or pending (False) tasks; since and
+        until bound created_at inclusively.
+        """
+        where = [not_purged()]
+        params = []
+        if category is None:
+            where.append("category NOT IN (SELECT name FROM deleted_categories)")
+        else:
+            where.append("category = ?")
+            params.append(category)
+        if done is not None:
+            where.append("done = ?")
+            params.append(int(done))
+        if since is not None:
+            where.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("created_at <= ?")
+            params.append(until)
+        return " AND ".join(where), params
+
+    def iter_todos(self, category=None, done=None):
+        """Yield tasks in id order one row at a time, with their category."""
+        where, params = self._filter(category, done)
+        c = self.conn.execute(
+            f"SELECT {TODO_COLUMNS}, category FROM todos WHERE {where} ORDER BY id",
+            params,
+        )
+        for row in c:
+            todo = row_to_todo(row)
+            todo.category = row[5]
+            yield todo
+
+    def export_rows(
+        self,
+        category=None,
+        done=None,
+        since=None,
+        until=None,
+        batch_size=EXPORT_BATCH_SIZE,
+    ):
+        """Yield EXPORT_FIELDS tuples ordered by category and id.
+
+        Rows are fetched batch_size at a time, so only one batch is ever held
+        in memory whatever the size of the database.
+        """
+        where, params = self._filter(category, done, since, until)
+        c = self.conn.cursor()
+        c.execute(
+            "SELECT id, category, text, done, notes, created_at, note_updated_at"
+            f" FROM todos WHERE {where} ORDER BY category, id",
+            params,
+        )
+        while True:
+            rows = c.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row
+
+    def get_notes(self, todo_id):
+        row = self.conn.execute(
+            "SELECT notes FROM todos WHERE id = ?", (todo_id,)
+        ).fetchone()
+        return row[0] if row else ""
+
+    def count_todos(self, category, view="all"):
+        # Most views are counted by triggers, so this is a lookup rather
+        # than a COUNT(*)
+        row = self.conn.execute(VIEW_SQL[view]["count"], (category,)).fetchone()
+        return row[0] if row else 0
+
+    def count_todos_before(self, category, todo_id, view="all"):
+        """Position of todo_id in a view of its category, or None if not in it."""
+        queries = VIEW_SQL[view]
+        key = self.conn.execute(queries["key"], (todo_id, category)).fetchone()
+        if key is None:
+            return None
+        return self.conn.execute(
+            queries["count_before"], (category,) + tuple(key)
+        ).fetchone()[0]
+
+    def todos_after(self, category, after, limit, view="all"):
+        """Up to limit tasks following the sort key after (a tuple) in view order."""
+        c = self.conn.execute(
+            VIEW_SQL[view]["after"], (category,) + tuple(after) + (limit,)
+        )
+        return [row_to_todo(row) for row in c.fetchall()]
+
+    def todos_before(self, category, before, limit, view="all"):
+        c = self.conn.execute(
+            VIEW_SQL[view]["before"], (category,) + tuple(before) + (limit,)
+        )
+        return [row_to_todo(row) for row in reversed(c.fetchall())]
+
+    def todos_at_offset(self, category, offset, limit, view="all"):
+        # Only used when jumping to a page with no loaded neighbour to key off
+        c = self.conn.execute(VIEW_SQL[view]["offset"], (category, limit, offset))
+        return [row_to_todo(row) for row in c.fetchall()]
+
+    def add_todo(self, text, category="General"):
+        created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self.conn:
+            c = self.conn.execute(ADD_TODO_SQL, (text, category, created_at))
+        return c.lastrowid
+
+    def update_todo_done(self, todo_id, done):
+        with self.conn:
+            c = self.conn.execute(SET_DONE_SQL, (int(done), todo_id))
+        return c.rowcount > 0
+
+    def delete_todo(self, todo_id):
+        with self.conn:
+            c = self.conn.execute(DELETE_TODO_SQL, (todo_id,))
+        return c.rowcount > 0
+
+    def update_todo_notes(self, todo_id, notes):
+        note_updated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self.conn:
+            self.conn.execute(SET_NOTES_SQL, (notes, note_updated_at, todo_id))
+        return note_updated_at
+
+    def import_todos(
+        self, rows, dedup=False, batch_size=IMPORT_BATCH_SIZE, progress=None
+    ):
+        """Insert many tasks in a single transaction and return (imported, duplicates).
+
+        rows yields (text, category, done, notes, created_at, note_updated_at)
+        tuples and is consumed batch_size at a time with executemany. Once a
+        second batch arrives, the todos indexes and the FTS insert trigger are
+        dropped and rebuilt at the end, which is much cheaper than updating
+        them row by row. With dedup, rows whose (category, text) is already
+        stored or came earlier in the input are skipped. progress is called
+        with the number of rows read so far after each batch.
+        """
+        rows = iter(rows)
+        c = self.conn.cursor()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            first_id = c.execute("SELECT IFNULL(MAX(id), 0) + 1 FROM todos").fetchone()[
+                0
+            ]
+            if dedup:
+                # Staged first so duplicates can be found with set operations
+                c.execute(
+                    "CREATE TEMP TABLE import_rows"
+                    " (text, category, done, notes, created_at, note_updated_at)"
+                )
+                target = "temp.import_rows"
+            else:
+                target = "todos"
+            insert = (
+                f"INSERT INTO {target}"
+                " (text, category, done, notes, created_at, note_updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)"
+            )
+            suspended = None
+            read = 0
+            batch = list(islice(rows, batch_size))
+            while batch:
+                c.executemany(insert, batch)
+                read += len(batch)
+                if progress is not None:
+                    progress(read)
+                batch = list(islice(rows, batch_size))
+                if batch and suspended is None and not dedup:
+                    suspended = self._suspend_indexes(c)
+
+            duplicates = 0
+            if dedup:
+                # Keep the first occurrence within the input, then drop rows
+                # that are already stored
+                c.execute(
+                    "DELETE FROM temp.import_rows WHERE rowid NOT IN"
+                    " (SELECT MIN(rowid) FROM temp.import_rows GROUP BY category, text)"
+                )
+                duplicates += c.rowcount
+                c.execute(
+                    "DELETE FROM temp.import_rows WHERE (category, text) IN"
+                    " (SELECT category, text FROM main.todos)"
+                )
+                duplicates += c.rowcount
+                if read - duplicates > batch_size:
+                    suspended = self._suspend_indexes(c)
+                c.execute(
+                    "INSERT INTO todos"
+                    " (text, category, done, notes, created_at, note_updated_at)"
+                    " SELECT text, category, done, notes, created_at, note_updated_at"
+                    " FROM temp.import_rows ORDER BY rowid"
+                )
+                c.execute("DROP TABLE temp.import_rows")
+
+            if suspended is not None:
+                statements, resume_id = suspended
+                for sql in statements:
+                    c.execute(sql)
+                self._catch_up_bulk_insert(c, resume_id)
+            # Tasks imported into a closed tab bring the tab back; the closed
+            # tasks stay hidden until Purger has deleted them
+            c.execute(
+                "DELETE FROM deleted_categories WHERE name IN"
+                " (SELECT DISTINCT category FROM todos WHERE id >= ?)",
+                (first_id,),
+            )
+        except BaseException:
+            self.conn.rollback()
+            raise
+        self.conn.commit()
+        return read - duplicates, duplicates
+
+    def _suspend_indexes(self, c):
+        """Drop the todos indexes and BULK_INSERT_TRIGGERS inside a bulk insert.
+
+        Returns (statements that recreate them, first id inserted without them).
+        """
+        c.execute(
+            "SELECT type, name, sql FROM sqlite_master WHERE tbl_name = 'todos'"
+            " AND sql IS NOT NULL AND (type = 'index' OR name IN ({}))".format(
+                ", ".join("?" * len(BULK_INSERT_TRIGGERS))
+            ),
+            BULK_INSERT_TRIGGERS,
+        )
+        dropped = c.fetchall()
+        for kind, name, sql in dropped:
+            c.execute(f"DROP {kind.upper()} {name}")
+        resume_id = c.execute("SELECT IFNULL(MAX(id), 0) + 1 FROM todos").fetchone()[0]
+        return [sql for kind, name, sql in dropped], resume_id
+
+    def _catch_up_bulk_insert(self, c, resume_id):
+        """Do the work of BULK_INSERT_TRIGGERS for rows from resume_id on."""
+        if self.has_fts():
+            c.execute(
+                "INSERT INTO todos_fts (rowid, text, notes)"
+                " SELECT id, text, notes FROM todos WHERE id >= ?",
+                (resume_id,),
+            )
+        c.execute(
+            "SELECT category, COUNT(*), SUM(done) FROM todos WHERE id >= ?"
+            " GROUP BY category ORDER BY MIN(id)",
+            (resume_id,),
+        )
+        for name, total, done in c.fetchall():
+            c.execute(
+                "INSERT OR IGNORE INTO categories (name, position)"
+                f" VALUES (?, {NEXT_CATEGORY_POSITION})",
+                (name,),
+            )
+            c.execute(
+                "UPDATE categories SET total = total + ?, done = done + ?"
+                " WHERE name = ?",
+                (total, done, name),
+            )
+            c.execute(
+                "INSERT INTO changes (what, category) VALUES ('list', ?)", (name,)
+            )
+
+    def archive_done(self, cutoff, after_id=0, limit=ARCHIVE_CHUNK):
+        """Move up to limit tasks done before cutoff from todos to the archive.
+
+        Only tasks with ids above after_id are looked at, so a caller walks
+        the table once, chunk by chunk. Each chunk is its own transaction.
+        Returns (last id looked at, tasks moved), or None when none are left.
+        """
+        last_id, count = self.conn.execute(
+            "SELECT MAX(id), COUNT(*) FROM (SELECT id FROM todos"
+            f" WHERE id > ? AND {ARCHIVABLE} ORDER BY id LIMIT ?)",
+            (after_id, cutoff, limit),
+        ).fetchone()
+        if not count:
+            return None
+        archived_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO archive (id, text, done, category, notes, created_at,"
+                " note_updated_at, done_at, archived_at)"
+                " SELECT id, text, done, category, notes, created_at,"
+                " note_updated_at, done_at, ? FROM todos"
+                f" WHERE id > ? AND id <= ? AND {ARCHIVABLE}",
+                (archived_at, after_id, last_id, cutoff),
+            )
+            moved = self.conn.execute(
+                f"DELETE FROM todos WHERE id > ? AND id <= ? AND {ARCHIVABLE}",
+                (after_id, last_id, cutoff),
+            ).rowcount
+        return last_id, moved
+
+    def archived_todos(self, category, query="", limit=ARCHIVE_VIEW_LIMIT):
+        """Newest archived tasks of category whose text contains query.
+
+        Returned like search() results, with the full notes as the snippet.
+        """
+        sql = "SELECT id, category, done, text, notes FROM archive WHERE category = ?"
+        params = [category]
+        if query.strip():
+            sql += " AND text LIKE ? ESCAPE '\\'"
+            params.append(like_pattern(query))
+        c = self.conn.execute(sql + " ORDER BY id DESC LIMIT ?", params + [limit])
+        return [
+            {
+                "id": row[0],
+                "category": row[1],
+                "done": bool(row[2]),
+                "text": row[3],
+                "snippet": row[4],
+            }
+            for row in c.fetchall()
+        ]
+
+    def release_free_pages(self):
+        """Give free pages back to the file system, if auto_vacuum is incremental."""
+        if self.conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            self.conn.execute("PRAGMA incremental_vacuum").fetchall()
+
+    def vacuum(self):
+        """Rebuild the database file compactly.
+
+        Also switches on incremental auto-vacuum, so later archiving can
+        shrink the file without another full VACUUM.
+        """
+        self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self.conn.execute("VACUUM")
+
+    def add_category(self, cat):
+        """Create an empty category at the end of the tabs, or reopen a closed one.
+
+        A closed tab is reopened empty at once: the tasks it had stay hidden
+        below its purge watermark until Purger has deleted them.
+        """
+        with self.conn:
+            # Reopened at the end of the tabs, as a new one would be
+            self.conn.execute(
+                "DELETE FROM categories WHERE name = ?"
+                " AND name IN (SELECT name FROM deleted_categories)",
+                (cat,),
+            )
+            self.conn.execute("DELETE FROM deleted_categories WHERE name = ?", (cat,))
+            self.conn.execute(
+                "INSERT OR IGNORE INTO categories (name, position)"
+                f" VALUES (?, {NEXT_CATEGORY_POSITION})",
+                (cat,),
+            )
+
+    def close_category(self, cat):
+        """Hide a tab and its tasks at once; Purger deletes the tasks later.
+
+        Every task of the tab so far falls below the purge watermark
+        recorded here, so it is hidden and uncounted even if a tab of the
+        same name is opened again before the purge is done.
+        """
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO deleted_categories (name) VALUES (?)", (cat,)
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO purges (category, up_to)"
+                " VALUES (?, (SELECT IFNULL(MAX(id), 0) FROM todos))",
+                (cat,),
+            )
+            self.conn.execute(
+                "UPDATE categories SET total = 0, done = 0 WHERE name = ?", (cat,)
+            )
+
+    def pending_purges(self):
+        """Categories with closed tasks left to delete, e.g. after an interrupted purge."""
+        return [row[0] for row in self.conn.execute("SELECT category FROM purges")]
+
+    def get_all_categories(self):
+        """Names of the open tabs in tab order, never empty."""
+        cats = [
+            row[0]
+            for row in self.conn.execute(
+                "SELECT name FROM categories"
+                " WHERE name NOT IN (SELECT name FROM deleted_categories)"
+                " ORDER BY position"
+            )
+        ]
+        return cats if cats else ["General"]
+
+    def category_counts(self):
+        """{category: (done, total)} for every category."""
+        return {
+            name: (done, total)
+            for name, done, total in self.conn.execute(
+                "SELECT name, done, total FROM categories"
+            )
+        }
+
+
+_db = None
+
+
+def get_db():
+    """Return the session-wide Database, opening it on first use."""
+    global _db
+    if _db is None:
+        _db = Database()
+    return _db
+
+
+def close_db():
+    global _db
+    if _db is not None:
+        _db.close()
+        _db = None
+
+
+def init_db():
+    get_db().init_schema()
+
+
+def get_all_categories():
+    return get_db().get_all_categories()
+
+
+class TaskList:
+    """Virtualized view of one category's tasks, in the order of a TASK_VIEWS entry.
+
+    Only the page holding the cursor and its two neighbours are kept in
+    memory. Pages are fetched with keyset pagination on the view's sort key,
+    continuing from an adjacent loaded page, so scrolling costs the same on
+    a category of a thousand rows or a million. Supports len() and indexing
+    like a list.
+
+    Mutations go to writer when one is given (a WriteQueue) and straight to
+    db otherwise; either way the loaded pages are patched at once.
+    """
+
+    def __init__(self, db, category, page_size=PAGE_SIZE, writer=None, view="all"):
+        self.db = db
+        self.category = category
+        self.view = view
+        self._spec = TASK_VIEWS[view]
+        self.page_size = page_size
+        self.writer = writer
+        self.writes = writer if writer is not None else db
+        self._count = None
+        self._pages = {}  # page number -> list of todo dicts
+
+    def _sync(self):
+        # Reads must see the writes still waiting in the queue
+        if self.writer is not None:
+            self.writer.flush()
+
+    def __len__(self):
+        if self._count is None:
+            self._sync()
+            self._count = self.db.count_todos(self.category, self.view)
+        return self._count
+
+    def __getitem__(self, index):
+        if not 0 <= index < len(self):
+            raise IndexError("task index out of range")
+        page_no, offset = divmod(index, self.page_size)
+        return self._page(page_no)[offset]
+
+    @property
+    def cached_rows(self):
+        return sum(len(page) for page in self._pages.values())
+
+    def _page(self, page_no):
+        page = self._pages.get(page_no)
+        if page is None:
+            page = self._fetch(page_no)
+            self._pages[page_no] = page
+        return page
+
+    def _fetch(self, page_no):
+        self._sync()
+        previous = self._pages.get(page_no - 1)
+        following = self._pages.get(page_no + 1)
+        if previous:
+            return self.db.todos_after(
+                self.category, self._key(previous[-1]), self.page_size, self.view
+            )
+        if following:
+            return self.db.todos_before(
+                self.category, self._key(following[0]), self.page_size, self.view
+            )
+        return self.db.todos_at_offset(
+            self.category, page_no * self.page_size, self.page_size, self.view
+        )
+
+    def _key(self, todo):
+        return tuple(todo[column] for column in self._spec["order"])
+
+    def _invalidate(self):
+        # The row moved within the view or left it: read the view again
+        self._pages.clear()
+        self._count = None
+
+    def focus(self, index):
+        """Load the pages around index, prefetching its neighbours, and drop the rest."""
+        if len(self) == 0:
+            self._pages.clear()
+            return
+        page_no = min(index, len(self) - 1) // self.page_size
+        last_page = (len(self) - 1) // self.page_size
+        self._page(page_no)
+        for neighbour in (page_no - 1, page_no + 1):
+            if 0 <= neighbour <= last_page:
+                self._page(neighbour)
+        for loaded in list(self._pages):
+            if abs(loaded - page_no) > 1:
+                del self._pages[loaded]
+
+    def refresh(self, ids):
+        """Read the loaded rows among ids again, after they were edited elsewhere."""
+        for page in self._pages.values():
+            for i, todo in enumerate(page):
+                if todo["id"] in ids:
+                    fresh = self.db.get_todo(todo["id"])
+                    if fresh is None:
+                        continue
+                    moved = self._key(fresh) != self._key(todo)
+                    if moved or not self._spec["test"](fresh):
+                        self._invalidate()
+                        return
+                    page[i] = fresh
+
+    def index_of(self, todo_id):
+        """Position of todo_id in this view, or None if the view leaves it out."""
+        self._sync()
+        return self.db.count_todos_before(self.category, todo_id, self.view)
+
+    def toggle(self, index):
+        """Flip a task's done flag and return the new value.
+
+        The task leaves the list when the view no longer includes it.
+        """
+        todo = self[index]
+        todo["done"] = not todo["done"]
+        self.writes.update_todo_done(todo["id"], todo["done"])
+        if not self._spec["test"](todo):
+            self._remove(index)
+        return todo["done"]
+
+    def add(self, text):
+        """Insert a task and return (its id, its index in this view).
+
+        The id is None when the queued insert failed or is still waiting
+        for a busy database; the index is None then too, or when the view
+        leaves the new task out.
+        """
+        index = len(self)
+        todo_id = self.writes.add_todo(text, self.category)
+        if todo_id is None:
+            return None, None
+        todo = self.db.get_todo(todo_id)
+        if not self._spec["test"](todo):
+            return todo_id, None
+        self._count += 1
+        if self._spec["descending"]:
+            # Sorts near the start (after any future-dated imports): loaded
+            # pages shift, so read them again
+            self._pages.clear()
+            return todo_id, self.index_of(todo_id)
+        page = self._pages.get(index // self.page_size)
+        if page is not None:
+            page.append(todo)
+        return todo_id, index
+
+    def delete(self, index):
+        todo = self[index]
+        self.writes.delete_todo(todo["id"])
+        self._remove(index)
+
+    def _remove(self, index):
+        # Shift one row back across consecutive loaded pages. The page that
+        # cannot be refilled by a loaded neighbour is one row short (unless
+        # it was the last), so it and every page after it are dropped and
+        # refetched on demand.
+        last_page = (self._count - 1) // self.page_size
+        self._count -= 1
+        page_no, offset = divmod(index, self.page_size)
+        self._pages[page_no].pop(offset)
+        while page_no < last_page and page_no + 1 in self._pages:
+            self._pages[page_no].append(self._pages[page_no + 1].pop(0))
+            page_no += 1
+        keep = page_no if page_no == last_page else page_no - 1
+        for loaded in list(self._pages):
+            if loaded > keep or not self._pages[loaded]:
+                del self._pages[loaded]
+
+    def set_notes(self, index, notes):
+        todo = self[index]
+        key = self._key(todo)
+        todo["note_updated_at"] = self.writes.update_todo_notes(todo["id"], notes)
+        if self._key(todo) != key:
+            self._invalidate()
+
+
+class TaskStore:
+    """Per-category TaskLists, patched in place on every mutation.
+
+    Each mutation is written through to the database and applied to the
+    loaded pages of its TaskList, so the category never has to be
+    re-selected. When another connection has committed, which PRAGMA
+    data_version tells us cheaply, the change log says what to refresh:
+    edited rows are read again, and categories that gained or lost rows are
+    dropped. tabs_changed is set when categories were created, closed or
+    reopened.
+
+    Each category is listed in its own view (see TASK_VIEWS), which is
+    remembered for the session even when its list is evicted or reloaded.
+
+    Categories are loaded the first time they are asked for and evicted least
+    recently used first once more than max_rows rows are cached; the category
+    being accessed is never evicted.
+
+    With a writer (WriteQueue), mutations are queued rather than committed
+    before returning, and the cache is checked against the writer's
+    connection so the queue's own commits don't count as external changes.
+    """
+
+    def __init__(
+        self, db, max_rows=TASK_CACHE_ROWS, max_notes=NOTES_CACHE_SIZE, writer=None
+    ):
+        self.db = db
+        self.max_rows = max_rows
+        self.max_notes = max_notes
+        self.writer = writer
+        self._lists = OrderedDict()  # category -> TaskList, LRU order
+        self._notes = OrderedDict()  # todo id -> notes of recently viewed tasks
+        self._note_layouts = {}  # todo id -> (notes, NoteLayout), for those in _notes
+        self._counts = None  # category_counts(), until the next change
+        self._views = {}  # category -> TASK_VIEWS name, when not "all"
+        self.tabs_changed = False
+        # In this order, so no commit can slip in between unseen
+        self._data_version = self._read_data_version()
+        self._change_seq = db.last_change()
+
+    def _read_data_version(self):
+        if self.writer is not None:
+            return self.writer.data_version()
+        return self.db.data_version()
+
+    def _check_external_changes(self):
+        version = self._read_data_version()
+        # None while the writer is busy; checked again next time
+        if version is None or version == self._data_version:
+            return
+        self._data_version = version
+        self._sync()
+        changes = self.db.changes_since(self._change_seq)
+        if changes is None:
+            self.reload()
+            return
+        edited = {}  # category -> ids of tasks edited in place
+        for seq, what, category, todo_id in changes:
+            self._change_seq = seq
+            if what == "task":
+                edited.setdefault(category, set()).add(todo_id)
+                self._notes.pop(todo_id, None)
+            elif what == "list":
+                self._lists.pop(category, None)
+            else:
+                self.tabs_changed = True
+        for category, ids in edited.items():
+            todos = self._lists.get(category)
+            if todos is not None:
+                todos.refresh(ids)
+        if changes:
+            self._counts = None
+
+    def reload(self):
+        """Forget everything cached, so it is read again from the database."""
+        self._lists.clear()
+        self._notes.clear()
+        self._counts = None
+        self._change_seq = self.db.last_change()
+        self.tabs_changed = True
+
+    def _sync(self):
+        if self.writer is not None:
+            self.writer.flush()
+
+    def _evict(self, keep):
+        cached_rows = sum(todos.cached_rows for todos in self._lists.values())
+        for category in list(self._lists):
+            if cached_rows <= self.max_rows:
+                break
+            if category != keep:
+                cached_rows -= self._lists[category].cached_rows
+                self.drop(category)
+
+    def todos(self, category):
+        self._check_external_changes()
+        todos = self._lists.get(category)
+        if todos is None:
+            todos = TaskList(
+                self.db, category, writer=self.writer, view=self.view(category)
+            )
+            self._lists[category] = todos
+        else:
+            self._lists.move_to_end(category)
+        return todos
+
+    def focus(self, category, index):
+        self.todos(category).focus(index)
+        self._evict(keep=category)
+
+    def view(self, category):
+        return self._views.get(category, "all")
+
+    def set_view(self, category, view):
+        """List category in another TASK_VIEWS order, read afresh from the database."""
+        self._views[category] = view
+        self._lists.pop(category, None)
+
+    def position(self, category, todo_id):
+        """Index of todo_id in category's view, or None if the view leaves it out."""
+        return self.todos(category).index_of(todo_id)
+
+    def counts(self):
+        """{category: (done, total)}, read again only after a change."""
+        self._check_external_changes()
+        if self._counts is None:
+            self._sync()
+            self._counts = self.db.category_counts()
+        return self._counts
+
+    def _count(self, category, done, total):
+        # Patched rather than read again, as queued writes may not be saved yet
+        if self._counts is not None:
+            old_done, old_total = self._counts.get(category, (0, 0))
+            self._counts[category] = (old_done + done, old_total + total)
+
+    def toggle(self, category, index):
+        done = self.todos(category).toggle(index)
+        self._count(category, 1 if done else -1, 0)
+
+    def add(self, category, text):
+        """Insert a task and return (its id, its position in the category's view).
+
+        See TaskList.add for when either is None. The tab's count goes up
+        either way: a failed insert reloads the store (see
+        WriteQueue.take_error), and one still queued is saved later.
+        """
+        todo_id, index = self.todos(category).add(text)
+        self._count(category, 0, 1)
+        return todo_id, index
+
+    def delete(self, category, index):
+        todos = self.todos(category)
+        done = todos[index]["done"]
+        todos.delete(index)
+        self._count(category, -1 if done else 0, -1)
+
+    def notes(self, todo_id):
+        """Notes of one task, read from the database only when not recently viewed."""
+        notes = self._notes.get(todo_id)
+        if notes is None:
+            self._sync()
+            notes = self.db.get_notes(todo_id)
+            self._notes[todo_id] = notes
+            if len(self._notes) > self.max_notes:
+                self._notes.popitem(last=False)
+        else:
+            self._notes.move_to_end(todo_id)
+        return notes
+
+    def note_layout(self, todo_id, width):
+        """NoteLayout of a task's notes at width, kept while its notes are cached."""
+        notes = self.notes(todo_id)
+        entry = self._note_layouts.get(todo_id)
+        if entry is None or entry[0] is not notes or entry[1].width != width:
+            # Layouts of notes since evicted or edited would pin their text
+            for stale_id, (stale_notes, _) in list(self._note_layouts.items()):
+                if self._notes.get(stale_id) is not stale_notes:
+                    del self._note_layouts[stale_id]
+            entry = self._note_layouts[todo_id] = (notes, NoteLayout(notes, width))
+        return entry[1]
+
+    def set_notes(self, category, index, notes):
+        todos = self.todos(category)
+        # Taken first: the edit can move the task within its view
+        todo_id = todos[index]["id"]
+        todos.set_notes(index, notes)
+        self._notes[todo_id] = notes
+        self._notes.move_to_end(todo_id)
+        if len(self._notes) > self.max_notes:
+            self._notes.popitem(last=False)
+
+    def drop(self, category):
+        self._lists.pop(category, None)
+        self._counts = None
+
+
+def is_busy(error):
+    """Whether a sqlite3 error means another connection held the lock too long."""
+    return isinstance(error, sqlite3.OperationalError) and "locked" in str(error)
+
+
+class WriteQueue:
+    """Write-behind queue applying task mutations on a background thread.
+
+    update_todo_done, delete_todo and update_todo_notes mirror Database but
+    only queue their statement and return at once, so the interface never
+    waits on the disk. The writer thread commits everything queued since
+    its last commit in one transaction, over its own connection. Once
+    max_pending statements are waiting, posting blocks until there is
+    room. add_todo waits for its insert, as the new id is needed.
+
+    Transactions that find the database locked are retried; those that
+    still fail are rolled back and their error kept for take_error().
+    Waiting for the queue is bounded by flush_timeout: past it the queue is
+    behind(), further flushes return at once, and take_caught_up() tells
+    when everything has been saved so what was read meanwhile can be read
+    again. close() writes whatever is still queued.
+    """
+
+    def __init__(
+        self,
+        db_path,
+        max_pending=WRITE_QUEUE_SIZE,
+        synchronous=DB_SYNCHRONOUS,
+        flush_timeout=FLUSH_TIMEOUT,
+    ):
+        self.max_pending = max_pending
+        self.flush_timeout = flush_timeout
+        # Also used from the interface thread, for data_version(), under _conn_lock
+        self.conn = sqlite3.connect(
+            db_path, timeout=BUSY_TIMEOUT, check_same_thread=False
+        )
+        self.conn.execute(f"PRAGMA synchronous={synchronous}")
+        self._conn_lock = threading.Lock()
+        self._pending = []  # (sql, params, result list or None)
+        self._writing = False
+        self._behind = False  # a flush gave up waiting
+        self._errors = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def post(self, sql, params=(), result=None):
+        """Queue one statement; result, if given, receives its lastrowid once saved."""
+        with self._cond:
+            while len(self._pending) >= self.max_pending:
+                self._cond.wait()
+            self._pending.append((sql, params, result))
+            self._cond.notify_all()
+
+    def flush(self):
+        """Wait until everything queued so far has been committed (or failed).
+
+        Returns False if that takes over flush_timeout, or if the queue is
+        already behind, so the caller goes on without the queued writes.
+        """
+        with self._cond:
+            if self._behind and (self._pending or self._writing):
+                return False
+            deadline = time.monotonic() + self.flush_timeout
+            while self._pending or self._writing:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    self._behind = True
+                    return False
+                self._cond.wait(left)
+            return True
+
+    def behind(self):
+        """Whether a flush gave up and the queue has not caught up since."""
+        with self._cond:
+            return self._behind
+
+    def take_caught_up(self):
+        """True once, when the queue has saved everything after falling behind."""
+        with self._cond:
+            if self._behind and not self._pending and not self._writing:
+                self._behind = False
+                return True
+            return False
+
+    def take_error(self):
+        """Oldest error not yet reported, or None."""
+        with self._cond:
+            return self._errors.pop(0) if self._errors else None
+
+    def data_version(self):
+        """PRAGMA data_version of the writer's connection, None while it is writing.
+
+        Unlike the interface's own connection, this one does not change when
+        the queue commits, only when somebody else does.
+        """
+        if not self._conn_lock.acquire(blocking=False):
+            return None
+        try:
+            return self.conn.execute("PRAGMA data_version").fetchone()[0]
+        finally:
+            self._conn_lock.release()
+
+    def add_todo(self, text, category="General"):
+        created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        result = []
+        self.post(ADD_TODO_SQL, (text, category, created_at), result)
+        # None if it failed, or is still queued behind a busy database
+        self.flush()
+        return result[0] if result else None
+
+    def update_todo_done(self, todo_id, done):
+        self.post(SET_DONE_SQL, (int(done), todo_id))
+
+    def delete_todo(self, todo_id):
+        self.post(DELETE_TODO_SQL, (todo_id,))
+
+    def update_todo_notes(self, todo_id, notes):
+        note_updated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.post(SET_NOTES_SQL, (notes, note_updated_at, todo_id))
+        return note_updated_at
+
+    def close(self):
+        """Write everything still queued, however long it takes, and stop."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self.conn.close()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                batch = self._pending
+                self._pending = []
+                self._writing = True
+                self._cond.notify_all()  # room for blocked posters
+            error = self._write(batch)
+            with self._cond:
+                self._writing = False
+                if error is not None:
+                    self._errors.append(error)
+                self._cond.notify_all()
+
+    def _write(self, batch):
+        for attempt in range(WRITE_RETRIES + 1):
+            if attempt:
+                time.sleep(BUSY_RETRY_PAUSE * attempt)
+            ids = []
+            with self._conn_lock:
+                try:
+                    with self.conn:
+                        for sql, params, result in batch:
+                            row_id = self.conn.execute(sql, params).lastrowid
+                            if result is not None:
+                                ids.append((result, row_id))
+                except sqlite3.Error as e:
+                    error = str(e)
+                    if is_busy(e):
+                        continue
+                    return error
+            for result, row_id in ids:
+                result.append(row_id)
+            return None
+        return error
+
+
+class Purger:
+    """Deletes the tasks of closed tabs on a background thread.
+
+    Each category is emptied in transactions of chunk rows over a separate
+    connection, pausing between them, so the interface and other writers
+    never wait long for the write lock. Only tasks up to the category's
+    purge watermark are deleted, so a tab reopened meanwhile keeps its new
+    tasks. The watermark stays recorded until the purge is done, so an
+    interrupted purge is found again with Database.pending_purges().
+    """
+
+    def __init__(self, db_path, chunk=PURGE_CHUNK, pause=PURGE_PAUSE):
+        self.db_path = db_path
+        self.chunk = chunk
+        self.pause = pause
+        self._pending = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+
+    def purge(self, category):
+        with self._cond:
+            if category not in self._pending:
+                self._pending.append(category)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def close(self):
+        """Stop after the current chunk; the rest is resumed on next start."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT)
+        try:
+            while True:
+                with self._cond:
+                    while not self._pending and not self._closed:
+                        self._cond.wait()
+                    if self._closed:
+                        return
+                    category = self._pending[0]
+                self._purge(conn, category)
+                with self._cond:
+                    self._pending.remove(category)
+        finally:
+            conn.close()
+
+    def _purge(self, conn, category):
+        while not self._closed:
+            try:
+                with conn:
+                    deleted = conn.execute(
+                        "DELETE FROM todos WHERE id IN (SELECT id FROM todos"
+                        " WHERE category = ?"
+                        " AND id <= (SELECT up_to FROM purges WHERE category = ?)"
+                        " ORDER BY id LIMIT ?)",
+                        (category, category, self.chunk),
+                    ).rowcount
+                    if deleted < self.chunk:
+                        conn.execute(
+                            "DELETE FROM purges WHERE category = ?", (category,)
+                        )
+                        # Forget the tab too, unless it was reopened
+                        conn.execute(
+                            "DELETE FROM categories WHERE name = ? AND total = 0"
+                            " AND name IN (SELECT name FROM deleted_categories)",
+                            (category,),
+                        )
+                        return
+            except sqlite3.OperationalError as e:
+                if not is_busy(e):
+                    raise
+                # Somebody else is writing; the chunk is simply tried again
+                time.sleep(BUSY_RETRY_PAUSE)
+                continue
+            time.sleep(self.pause)
+
+
+def archive_cutoff(days):
+    """Tasks done before this timestamp are old enough to archive."""
+    return (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class Archiver:
+    """Moves tasks done before cutoff to the archive table.
+
+    Walks todos once in id order, chunk rows per transaction with a pause
+    between them, so it can run on a background thread (start()) while the
+    interface and other instances keep writing. The pages freed are then
+    given back to the file system when incremental auto-vacuum is on.
+    """
+
+    def __init__(self, db_path, cutoff, chunk=ARCHIVE_CHUNK, pause=PURGE_PAUSE):
+        self.db_path = db_path
+        self.cutoff = cutoff
+        self.chunk = chunk
+        self.pause = pause
+        self.moved = 0
+        self._closed = False
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stop after the current chunk; the rest waits for the next run."""
+        self._closed = True
+        if self._thread is not None:
+            self._thread.join()
+
+    def run(self):
+        db = Database(self.db_path)
+        try:
+            after_id = 0
+            while not self._closed:
+                try:
+                    step = db.archive_done(self.cutoff, after_id, self.chunk)
+                    if step is None:
+                        db.release_free_pages()
+                        return
+                except sqlite3.OperationalError as e:
+                    if not is_busy(e):
+                        raise
+                    time.sleep(BUSY_RETRY_PAUSE)
+                    continue
+                after_id, count = step
+                self.moved += count
+                if self.pause:
+                    time.sleep(self.pause)
+        finally:
+            db.close()
+
+
+def iter_wrapped(text, width):
+    """Yield the lines of wrap_text(text, width), wrapping only as far as consumed."""
+    if width <= 0:
+        yield text
+        return
+    # Walk an offset rather than slicing off the rest of the text, so long
+    # paragraphs wrap in linear time
+    pos, end = 0, len(text)
+    while end - pos > width:
+        # Find the last space within the width limit
+        split_at = text.rfind(" ", pos, pos + width)
+        if split_at == -1:
+            # No space found, hard break at width
+            split_at = pos + width
+        yield text[pos:split_at]
+        pos = split_at
+        while pos < end and text[pos].isspace():
+            pos += 1
+    if pos < end:
+        yield text[pos:]
+
+
+def wrap_text(text, width):
+    """Wrap text to fit within a given width, returning a list of lines."""
+    return list(iter_wrapped(text, width)) or [""]
+
+
+class WrapCache:
+    """Bounded LRU of wrap_text results keyed by (row id, content version, width).
+
+    The version is whatever changes together with the text; callers pass the
+    text itself, so an edited row never hits a stale entry. The cache is
+    emptied when the terminal width changes, as no entry can be reused then.
+    """
+
+    def __init__(self, max_entries=WRAP_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.width = None
+        self._entries = OrderedDict()
+
+    def set_width(self, width):
+        if width != self.width:
+            self.width = width
+            self._entries.clear()
+
+    def wrap(self, row_id, version, text, width, wrapper=wrap_text):
+        key = (row_id, version, width)
+        lines = self._entries.get(key)
+        if lines is None:
+            lines = wrapper(text, width)
+            self._entries[key] = lines
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        else:
+            self._entries.move_to_end(key)
+        return lines
+
+    def line_count(self, row_id, version, text, width):
+        return len(self.wrap(row_id, version, text, width))
+
+
+def get_wrapped_input(stdscr, start_y, start_x, width, max_lines, prompt=""):
+    """Get user input with text wrapping support."""
+    curses.curs_set(2)  # Block cursor
+    text = ""
+
+    while True:
+        # Clear the input area
+        for i in range(max_lines):
+            stdscr.addstr(start_y + i, start_x, " " * width)
+
+        # Display prompt and wrapped text
+        full_text = prompt + text
+        wrapped = wrap_text(full_text, width)
+
+        for i, line in enumerate(wrapped[:max_lines]):
+            stdscr.addstr(start_y + i, start_x, line)
+
+        # Position cursor at the end of text
+        if wrapped:
+            cursor_line = min(len(wrapped) - 1, max_lines - 1)
+            cursor_col = len(wrapped[cursor_line])
+            stdscr.move(start_y + cursor_line, start_x + cursor_col)
+
+        stdscr.refresh()
+        key = stdscr.getch()
+
+        if key == ord("\n"):  # Enter - submit
+            break
+        elif key == 27:  # Escape - cancel
+            text = ""
+            break
+        elif key in (curses.KEY_BACKSPACE, 127, 8):  # Backspace
+            if text:
+                text = text[:-1]
+        elif key >= 32 and key <= 126:  # Printable ASCII
+            text += chr(key)
+
+    curses.curs_set(0)  # Hide cursor
+    return text
+
+
+class RowCounts:
+    """Fenwick tree over the display rows each line of a note wraps to.
+
+    Gives the display row a line starts on, and the line a display row
+    belongs to, in O(log n); changing one line's count is O(log n) too.
+    """
+
+    def __init__(self, counts):
+        self.rebuild(counts)
+
+    def rebuild(self, counts):
+        self.counts = list(counts)
+        n = len(self.counts)
+        tree = [0] + self.counts
+        for i in range(1, n + 1):
+            parent = i + (i & -i)
+            if parent <= n:
+                tree[parent] += tree[i]
+        self._tree = tree
+        self._top_bit = 1 << (n.bit_length() - 1) if n else 0
+
+    def set(self, line, count):
+        delta = count - self.counts[line]
+        if delta:
+            self.counts[line] = count
+            i = line + 1
+            while i < len(self._tree):
+                self._tree[i] += delta
+                i += i & -i
+
+    def total(self):
+        return self.start_of(len(self.counts))
+
+    def start_of(self, line):
+        """Display row on which line starts (sum of the counts before it)."""
+        total = 0
+        i = line
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def find(self, row):
+        """Return (line, row within that line) for a display row."""
+        pos = 0
+        bit = self._top_bit
+        while bit:
+            nxt = pos + bit
+            if nxt < len(self._tree) and self._tree[nxt] <= row:
+                pos = nxt
+                row -= self._tree[nxt]
+            bit >>= 1
+        return pos, row
+
+
+class TextBuffer:
+    """Text being edited, as lines plus a gap buffer for the cursor line.
+
+    The cursor line lives in two character lists (the text before the
+    cursor, and the text after it reversed), so typing and deleting at the
+    cursor never copy the line. Each line's display row count is kept in a
+    RowCounts tree and only recomputed for the lines an edit touched.
+    """
+
+    def __init__(self, text, width):
+        self.width = max(1, width)
+        self.lines = text.split("\n") if text else [""]
+        self.row_counts = RowCounts(self._rows_for(len(line)) for line in self.lines)
+        # The cursor starts at the end of the text
+        self.row = len(self.lines) - 1
+        self._before = list(self.lines[self.row])
+        self._after = []
+
+    def _rows_for(self, length):
+        return max(1, -(-length // self.width))
+
+    @property
+    def col(self):
+        return len(self._before)
+
+    def line_length(self, line):
+        if line == self.row:
+            return len(self._before) + len(self._after)
+        return len(self.lines[line])
+
+    def line_text(self, line):
+        if line == self.row:
+            return "".join(self._before) + "".join(reversed(self._after))
+        return self.lines[line]
+
+    def text(self):
+        self._store_line()
+        return "\n".join(self.lines)
+
+    def _store_line(self):
+        self.lines[self.row] = self.line_text(self.row)
+
+    def _load_line(self, row, col):
+        self._store_line()
+        self.row = row
+        line = self.lines[row]
+        col = min(col, len(line))
+        self._before = list(line[:col])
+        self._after = list(reversed(line[col:]))
+
+    def _recount_cursor_line(self):
+        self.row_counts.set(self.row, self._rows_for(self.line_length(self.row)))
+
+    def insert(self, text):
+        """Insert text at the cursor; pasted blocks arrive here in one call."""
+        if "\n" not in text:
+            self._before.extend(text)
+            self._recount_cursor_line()
+            return
+        pieces = text.split("\n")
+        head = "".join(self._before) + pieces[0]
+        tail = "".join(reversed(self._after))
+        new_lines = [head] + pieces[1:-1] + [pieces[-1] + tail]
+        self.lines[self.row : self.row + 1] = new_lines
+        counts = self.row_counts.counts
+        counts[self.row : self.row + 1] = [
+            self._rows_for(len(line)) for line in new_lines
+        ]
+        self.row_counts.rebuild(counts)
+        self.row += len(new_lines) - 1
+        self._before = list(pieces[-1])
+        self._after = list(reversed(tail))
+
+    def backspace(self):
+        if self._before:
+            self._before.pop()
+            self._recount_cursor_line()
+        elif self.row > 0:
+            # Merge with previous line
+            previous = self.lines[self.row - 1]
+            del self.lines[self.row]
+            counts = self.row_counts.counts
+            del counts[self.row]
+            self.row_counts.rebuild(counts)
+            self.row -= 1
+            self._before = list(previous)
+            self._recount_cursor_line()
+
+    def delete(self):
+        if self._after:
+            self._after.pop()
+            self._recount_cursor_line()
+        elif self.row < len(self.lines) - 1:
+            # Merge with next line
+            following = self.lines.pop(self.row + 1)
+            self._after = list(reversed(following))
+            counts = self.row_counts.counts
+            del counts[self.row + 1]
+            self.row_counts.rebuild(counts)
+            self._recount_cursor_line()
+
+    def move_left(self):
+        if self._before:
+            self._after.append(self._before.pop())
+        elif self.row > 0:
+            self._load_line(self.row - 1, len(self.lines[self.row - 1]))
+
+    def move_right(self):
+        if self._after:
+            self._before.append(self._after.pop())
+        elif self.row < len(self.lines) - 1:
+            self._load_line(self.row + 1, 0)
+
+    def move_up(self):
+        if self.row > 0:
+            self._load_line(self.row - 1, self.col)
+
+    def move_down(self):
+        if self.row < len(self.lines) - 1:
+            self._load_line(self.row + 1, self.col)
+
+    def home(self):
+        self._after.extend(reversed(self._before))
+        self._before.clear()
+
+    def end(self):
+        self._before.extend(reversed(self._after))
+        self._after.clear()
+
+    def cursor_position(self):
+        """Return (display row, column within that row) of the cursor."""
+        chunk = min(self.col // self.width, self.row_counts.counts[self.row] - 1)
+        return (
+            self.row_counts.start_of(self.row) + chunk,
+            self.col - chunk * self.width,
+        )
+
+    def display_row(self, row):
+        """Text shown on a display row, or None past the end of the text."""
+        if row >= self.row_counts.total():
+            return None
+        line, chunk = self.row_counts.find(row)
+        start = chunk * self.width
+        return self.line_text(line)[start : start + self.width]
+
+
+def edit_multiline_text(stdscr, start_y, start_x, width, height, initial_text=""):
+    """Edit multiline text with basic navigation and text wrapping. Returns edited text or None if cancelled."""
+    curses.curs_set(2)  # Block cursor
+    buffer = TextBuffer(initial_text, width)
+    scroll_offset = 0
+
+    while True:
+        # Adjust scroll to keep cursor visible
+        cursor_display_line, screen_cursor_col = buffer.cursor_position()
+        if cursor_display_line < scroll_offset:
+            scroll_offset = cursor_display_line
+        elif cursor_display_line >= scroll_offset + height:
+            scroll_offset = cursor_display_line - height + 1
+
+        # Clear and draw the text area
+        for i in range(height):
+            stdscr.addstr(start_y + i, start_x, " " * width)
+            text = buffer.display_row(scroll_offset + i)
+            if text:
+                stdscr.addstr(start_y + i, start_x, text)
+
+        # Position cursor
+        screen_cursor_line = cursor_display_line - scroll_offset
+        stdscr.move(start_y + screen_cursor_line, start_x + screen_cursor_col)
+
+        stdscr.refresh()
+        key = stdscr.getch()
+
+        if key == 27:  # Escape - cancel
+            curses.curs_set(0)
+            return None
+        elif key == 6:  # Ctrl+F - save and finish
+            curses.curs_set(0)
+            return buffer.text()
+        elif key == ord("\n") or 32 <= key <= 126:  # New line / printable ASCII
+            # Gather keys already waiting (e.g. a paste) into a single insert
+            chunk = [chr(key)]
+            stdscr.nodelay(True)
+            while True:
+                key = stdscr.getch()
+                if key == ord("\n") or 32 <= key <= 126:
+                    chunk.append(chr(key))
+                else:
+                    if key != -1:
+                        curses.ungetch(key)
+                    break
+            stdscr.nodelay(False)
+            buffer.insert("".join(chunk))
+        elif key in (curses.KEY_BACKSPACE, 127, 8):  # Backspace
+            buffer.backspace()
+        elif key == curses.KEY_DC:  # Delete
+            buffer.delete()
+        elif key == curses.KEY_UP:
+            buffer.move_up()
+        elif key == curses.KEY_DOWN:
+            buffer.move_down()
+        elif key == curses.KEY_LEFT:
+            buffer.move_left()
+        elif key == curses.KEY_RIGHT:
+            buffer.move_right()
+        elif key == curses.KEY_HOME:
+            buffer.home()
+        elif key == curses.KEY_END:
+            buffer.end()
+
+
+class Search:
+    """State of the '/' search mode: the query being typed and its results.
+
+    The query runs from idle(), which the main loop calls once typing pauses
+    for poll_ms, and a query still running when the next key arrives is
+    abandoned.
+    """
+
+    poll_ms = SEARCH_DEBOUNCE_MS
+    placeholder = "Type to search all tasks"
+
+    def __init__(self, db):
+        self.db = db
+        self.query = ""
+        self.results = []
+        self.index = 0
+        self.stale = False  # query edited since the results were fetched
+
+    def edit(self, query):
+        self.query = query
+        self.stale = True
+
+    def run(self, cancel=None):
+        if not self.stale:
+            return
+        try:
+            self.results = self.db.search(self.query, cancel=cancel)
+        except sqlite3.OperationalError as e:
+            if str(e) != "interrupted":
+                raise
+            return  # a newer keystroke is waiting, it will trigger another run
+        self.stale = False
+        self.index = 0
+
+    def selected(self):
+        return self.results[self.index] if self.results else None
+
+    def prompt(self):
+        return f"Search: {self.query}_"
+
+    def refresh(self):
+        pass  # results only change in idle()
+
+    def idle(self):
+        self.run(cancel=input_pending)
+
+    def close(self):
+        pass
+
+
+class ArchiveView:
+    """Read-only list of one tab's archived tasks, newest first, opened with 'A'.
+
+    The archive is only read once the view is opened; typing filters on task
+    text. Driven and drawn like Search, but Enter opens nothing.
+    """
+
+    poll_ms = SEARCH_DEBOUNCE_MS
+    placeholder = "No archived tasks in this tab"
+
+    def __init__(self, db, category):
+        self.db = db
+        self.category = category
+        self.query = ""
+        self.index = 0
+        self.results = db.archived_todos(category)
+        self.stale = False
+
+    def edit(self, query):
+        self.query = query
+        self.stale = True
+
+    def selected(self):
+        return self.results[self.index] if self.results else None
+
+    def prompt(self):
+        return f"Archive of {self.category}: {self.query}_"
+
+    def refresh(self):
+        pass
+
+    def idle(self):
+        if self.stale:
+            self.results = self.db.archived_todos(self.category, self.query)
+            self.stale = False
+            self.index = 0
+
+    def close(self):
+        pass
+
+
+def fuzzy_match(query, text):
+    """Score query as a subsequence of text, fzf style, or return None.
+
+    Both arguments must already be lowercase. Returns (score, positions):
+    matches in a shorter span, on word boundaries and in consecutive runs
+    score higher.
+    """
+    # Leftmost end of a greedy forward match, then the latest start that
+    # still matches when scanning back from it: the tightest window
+    pos = -1
+    for ch in query:
+        pos = text.find(ch, pos + 1)
+        if pos == -1:
+            return None
+    end = pos
+    for ch in reversed(query):
+        pos = text.rfind(ch, 0, pos + 1) - 1
+    start = pos + 1
+
+    positions = []
+    score = 0
+    pos = start - 1
+    for ch in query:
+        pos = text.find(ch, pos + 1)
+        if positions and pos == positions[-1] + 1:
+            score += 4  # consecutive run
+        if pos == 0 or not text[pos - 1].isalnum():
+            score += 8  # start of a word
+        positions.append(pos)
+    return score + 16 * len(query) - (end - start + 1 - len(query)), positions
+
+
+def mark_positions(text, positions):
+    """Wrap the characters at positions in HIGHLIGHT_START/HIGHLIGHT_END."""
+    marked = []
+    last = 0
+    for pos in positions:
+        marked.append(text[last:pos])
+        marked.append(HIGHLIGHT_START + text[pos] + HIGHLIGHT_END)
+        last = pos + 1
+    marked.append(text[last:])
+    return "".join(marked)
+
+
+class FuzzyFinder:
+    """fzf-style finder over every task, scored on a background thread.
+
+    The worker reads all candidates over its own connection and scores them
+    in chunks of FUZZY_CHUNK, publishing the best FUZZY_LIMIT after each chunk
+    so results stream in while typing continues. A newer query abandons the
+    current pass; when it extends the last fully scored query, only that
+    query's matches are scored again.
+
+    Offers the same interface as Search (query, results marked up the same
+    way, index), so the main loop drives and draws both alike.
+    """
+
+    poll_ms = FUZZY_POLL_MS
+    placeholder = "Type to search all tasks"
+
+    def __init__(self, db_path, limit=FUZZY_LIMIT):
+        self.db_path = db_path
+        self.limit = limit
+        self.query = ""
+        self.results = []
+        self.index = 0
+        self.complete = False
+        self._cond = threading.Condition()
+        self._generation = 0  # bumped on every query change
+        self._published = ([], False)  # (results, whole pool scored)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def edit(self, query):
+        self.query = query
+        with self._cond:
+            self._generation += 1
+            self._cond.notify()
+
+    def refresh(self):
+        """Pick up results the worker published since the last call."""
+        with self._cond:
+            results, self.complete = self._published
+        if results is not self.results:
+            self.results = results
+            self.index = min(self.index, max(0, len(results) - 1))
+
+    def selected(self):
+        return self.results[self.index] if self.results else None
+
+    def prompt(self):
+        return f"Find: {self.query}_" + ("" if self.complete else " …")
+
+    def idle(self):
+        pass  # results are picked up by refresh() on every frame
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout=1)
+
+    def _publish(self, top, candidates, complete):
+        results = []
+        for _, negated_index, positions in sorted(top, reverse=True):
+            todo_id, category, done, text = candidates[-negated_index]
+            results.append(
+                {
+                    "id": todo_id,
+                    "category": category,
+                    "done": done,
+                    "text": mark_positions(text, positions),
+                }
+            )
+        with self._cond:
+            self._published = (results, complete)
+
+    def _load_candidates(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            c = conn.execute(
+                "SELECT id, category, done, text FROM todos"
+                " WHERE category NOT IN (SELECT name FROM deleted_categories)"
+                f" AND {not_purged()} ORDER BY id DESC"
+            )
+            candidates = []
+            while not self._closed:
+                rows = c.fetchmany(FUZZY_CHUNK)
+                if not rows:
+                    break
+                candidates.extend(
+                    (todo_id, category, bool(done), text)
+                    for todo_id, category, done, text in rows
+                )
+            return candidates
+        finally:
+            conn.close()
+
+    def _run(self):
+        candidates = self._load_candidates()
+        lowered = [text.lower() for _, _, _, text in candidates]
+        handled = -1
+        scored_query = None  # last query scored over its whole pool
+        matches = None  # candidate indexes matching scored_query
+        while True:
+            with self._cond:
+                while self._generation == handled and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                generation = self._generation
+                query = self.query.lower()
+            if not query.strip():
+                # Nothing typed yet: list the newest tasks
+                top = [(0, -i, []) for i in range(min(self.limit, len(candidates)))]
+                self._publish(top, candidates, True)
+                handled = generation
+                continue
+            if scored_query is not None and query.startswith(scored_query):
+                pool = matches
+            else:
+                pool = range(len(candidates))
+            found = []
+            # Min-heap of (score, -index, positions) holding the best results;
+            # on equal scores the newer task (lower index) wins
+            top = []
+            for chunk_start in range(0, len(pool), FUZZY_CHUNK):
+                if self._generation != generation or self._closed:
+                    break  # superseded; partial matches are discarded
+                for i in pool[chunk_start : chunk_start + FUZZY_CHUNK]:
+                    match = fuzzy_match(query, lowered[i])
+                    if match is None:
+                        continue
+                    found.append(i)
+                    entry = (match[0], -i, match[1])
+                    if len(top) < self.limit:
+                        heapq.heappush(top, entry)
+                    elif entry > top[0]:
+                        heapq.heapreplace(top, entry)
+                self._publish(top, candidates, False)
+            else:
+                self._publish(top, candidates, True)
+                scored_query = query
+                matches = found
+                handled = generation
+
+
+def input_pending():
+    """True when a key is already waiting on stdin."""
+    return bool(select.select([sys.stdin], [], [], 0)[0])
+
+
+def count_repeats(stdscr, keys, wait_ms=0):
+    """Read further repeats of the key sequence keys and return how many.
+
+    A held-down key piles up repeats while a frame is drawn; counting them
+    lets the main loop apply them all and draw a single frame, so it never
+    falls behind the keyboard. When no repeat is waiting yet, the first one
+    is waited for up to wait_ms. Whatever else is read is pushed back.
+    """
+    count = 0
+    stdscr.nodelay(True)
+    try:
+        while True:
+            read = []
+            for expected in keys:
+                key = stdscr.getch()
+                if key == -1 and not read and not count and wait_ms > 0:
+                    stdscr.timeout(wait_ms)
+                    key = stdscr.getch()
+                    stdscr.nodelay(True)
+                if key == -1:
+                    break
+                read.append(key)
+                if key != expected:
+                    break
+            if len(read) < len(keys) or read[-1] != keys[-1]:
+                for key in reversed(read):
+                    curses.ungetch(key)
+                return count
+            count += 1
+    finally:
+        stdscr.nodelay(False)
+
+
+class TimedConnection:
+    """sqlite3 connection wrapper that reports every execute() to a Profiler.
+
+    Only the SQL text is recorded, never the bound parameters, so the trace
+    holds no task content. execute() covers preparing the statement and
+    stepping to the first row, which is where SQLite does most of the work
+    for the sorted and aggregated queries here.
+    """
+
+    def __init__(self, conn, profiler):
+        self._conn = conn
+        self._profiler = profiler
+
+    def execute(self, sql, params=()):
+        start = time.perf_counter()
+        try:
+            return self._conn.execute(sql, params)
+        finally:
+            self._profiler.query(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, rows):
+        start = time.perf_counter()
+        try:
+            return self._conn.executemany(sql, rows)
+        finally:
+            self._profiler.query(sql, time.perf_counter() - start)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, *exc_info):
+        return self._conn.__exit__(*exc_info)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class Profiler:
+    """Per-frame and per-query timings for the status line and a trace file.
+
+    The main loop calls start_frame() when a key arrives, phase() as each
+    stage of the frame completes and end_frame() once it has been painted,
+    so a frame's phases add up to the key-to-paint latency. Frames that open
+    a prompt include the time spent in it. Records are appended to a JSON
+    Lines trace in batches, which rolls over at TRACE_MAX_BYTES.
+    """
+
+    def __init__(self, path=PROFILE_PATH, max_bytes=TRACE_MAX_BYTES):
+        import json
+
+        self._encode = json.JSONEncoder().encode
+        self.path = path
+        self.max_bytes = max_bytes
+        self._file = open(path, "a", encoding="utf-8")
+        self._pending = []
+        self._flushed_at = time.monotonic()
+        self.frames = 0
+        self.last = None  # the most recent frame record
+        self.start_frame(None)
+
+    def start_frame(self, key):
+        self._key = key
+        self._mark = time.perf_counter()
+        self._phases = {}
+        self._queries = 0
+        self._query_time = 0.0
+
+    def phase(self, name):
+        now = time.perf_counter()
+        self._phases[name] = self._phases.get(name, 0.0) + now - self._mark
+        self._mark = now
+
+    def query(self, sql, seconds):
+        self._queries += 1
+        self._query_time += seconds
+        self._record(
+            {
+                "type": "sql",
+                "frame": self.frames + 1,  # the frame in progress
+                "ms": round(seconds * 1000, 3),
+                "sql": " ".join(sql.split())[:200],
+            }
+        )
+
+    def end_frame(self):
+        self.frames += 1
+        record = {"type": "frame", "frame": self.frames, "key": self._key}
+        for name, seconds in self._phases.items():
+            record[name] = round(seconds * 1000, 3)
+        record["latency"] = round(sum(self._phases.values()) * 1000, 3)
+        record["sql"] = self._queries
+        record["sql_ms"] = round(self._query_time * 1000, 3)
+        self.last = record
+        self._record(record)
+
+    def summary(self):
+        """Short text for the status line describing the last frame."""
+        r = self.last
+        if r is None:
+            return ""
+        return (
+            f"{r['latency']:.1f}ms key→paint: layout {r.get('layout', 0):.1f}"
+            f" draw {r.get('draw', 0):.1f} refresh {r.get('refresh', 0):.1f}"
+            f" | sql {r['sql']}× {r['sql_ms']:.1f}ms"
+        )
+
+    def _record(self, record):
+        record["t"] = round(time.time(), 3)
+        self._pending.append(self._encode(record))
+        if time.monotonic() - self._flushed_at >= TRACE_FLUSH_SECONDS:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            self._file.write("\n".join(self._pending) + "\n")
+            self._pending = []
+            self._file.flush()
+            if self._file.tell() >= self.max_bytes:
+                self._file.close()
+                os.replace(self.path, self.path + ".1")
+                self._file = open(self.path, "a", encoding="utf-8")
+        self._flushed_at = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+
+HELP_LINES = [
+    "Available commands:",
+    "",
+    "Navigation:",
+    "   ↑↓ / Ctrl+P/N  Navigate between tasks",
+    "   Enter          Mark/unmark task (confirm)",
+    "   ←/→            Switch tab",
+    "   /              Search all tasks and notes",
+    "   f              Fuzzy-find a task",
+    "   v              Cycle view: all, pending, done, newest, noted",
+    "Preview pane:",
+    "   Alt+P          Toggle preview pane",
+    "   Alt+J/K        Scroll preview down/up",
+    "Task management:",
+    "   a              Add new task",
+    "   d              Delete selected task",
+    "   n              Edit notes for task",
+    "   e              Export tab (.jsonl/.csv/.md[.gz])",
+    "   A              Browse the tab's archived tasks",
+    "Tabs:",
+    "   Ctrl+T         New tab",
+    "   Ctrl+W         Close tab",
+    "Other:",
+    "   h              Show/hide help",
+    "   q              Quit program",
+    "In notes editor:",
+    "   Ctrl+F         Save notes",
+    "   Esc            Cancel editing",
+]
+
+HELP_HINT = "Press 'h' for help"
+WRITER_BEHIND = "The database is busy, changes are saved once it is free"
+
+
+def put(win, y, x, text, attr=0):
+    """addstr that tolerates writing into the bottom-right cell of a window."""
+    try:
+        win.addstr(y, x, text, attr)
+    except curses.error:
+        pass  # the text is drawn, only moving the cursor past the end fails
+
+
+class Pane:
+    """A persistent curses window that is only repainted when its inputs change.
+
+    update() skips drawing entirely when called with the same inputs as the
+    previous frame, and set_lines() rewrites only the rows that differ. Panes
+    are staged with noutrefresh(); the caller commits them all with doupdate().
+    """
+
+    def __init__(self, y, x, height, width):
+        self.win = curses.newwin(height, width, y, x)
+        self.height = height
+        self.width = width
+        self.invalidate()
+
+    def invalidate(self):
+        self._inputs = None
+        self._rows = [None] * self.height
+
+    def update(self, inputs, draw, *args):
+        if inputs == self._inputs:
+            return
+        self._inputs = inputs
+        self.win.erase()
+        draw(self.win, *args)
+        self.win.noutrefresh()
+
+    def set_lines(self, rows):
+        """Show rows, each a tuple of (x, text, attr) segments, repainting only changed rows."""
+        changed = False
+        for y in range(self.height):
+            row = rows[y] if y < len(rows) else ()
+            if row == self._rows[y]:
+                continue
+            self._rows[y] = row
+            self.win.move(y, 0)
+            self.win.clrtoeol()
+            for x, text, attr in row:
+                put(self.win, y, x, text, attr)
+            changed = True
+        if changed:
+            self.win.noutrefresh()
+
+
+class Screen:
+    """The panes of the main view, rebuilt only when the geometry changes."""
+
+    def __init__(self, stdscr):
+        self.stdscr = stdscr
+        self.geometry = None
+        self.panes = {}
+
+    def build(self, geometry, panes):
+        """Replace the panes; panes maps a name to its (y, x, height, width)."""
+        if self.geometry is None or geometry[:2] != self.geometry[:2]:
+            self.stdscr.clear()  # terminal was resized, repaint everything
+        else:
+            self.stdscr.erase()
+        self.stdscr.noutrefresh()
+        self.geometry = geometry
+        self.panes = {name: Pane(*box) for name, box in panes.items()}
+
+    def reset(self):
+        self.geometry = None
+        self.panes = {}
+
+    def invalidate(self):
+        """Force a full repaint after something drew over the panes on stdscr."""
+        self.stdscr.erase()
+        self.stdscr.noutrefresh()
+        for pane in self.panes.values():
+            pane.invalidate()
+
+
+class Layout:
+    """Where everything in the main view goes, for one terminal size.
+
+    Built once per size: the main loop replaces it when curses reports
+    KEY_RESIZE (or a prompt that swallowed the resize returns), so frames,
+    panes and input prompts all place themselves from the same numbers.
+    """
+
+    min_width = 80
+    min_height = 30
+    task_input_lines = 3
+
+    def __init__(self, height, width):
+        self.height = height
+        self.width = width
+        self.too_small = width < self.min_width or height < self.min_height
+
+        # Title
+        self.title_w = max(len(line) for line in ASCII_TITLE)
+        self.title_h = len(ASCII_TITLE)
+        self.title_x = max(0, (width - self.title_w) // 2)
+        self.title_y = 1
+        self.tab_bar_y = self.title_y + self.title_h
+        self.status_y = height - 2
+
+        # Main task list, the width of the title; available height leaves
+        # room for the help hint
+        available_height = height - (self.title_y + self.title_h) - 6
+        self.box_x = self.title_x
+        self.box_y = self.title_y + self.title_h + 2
+        self.box_w = self.title_w
+        self.full_box_h = available_height  # when the preview is hidden
+        self.preview_box_h = 8  # shorter fixed height when it is shown
+
+        # Detail panel below the task list, kept clear of the help hint
+        self.detail_y = self.box_y + self.preview_box_h + 1
+        self.detail_h = min(
+            max(10, available_height - self.preview_box_h - 1),
+            self.status_y - self.detail_y,
+        )
+
+        # Centered help screen, but slightly lower
+        self.help_w = max(len(line) for line in HELP_LINES)
+        self.help_y = max(
+            self.tab_bar_y, (height - len(HELP_LINES)) // 2 + height // 10
+        )
+        self._panes = {}
+
+    def fit(self, stdscr):
+        """This layout if the terminal still has its size, else a new one."""
+        height, width = stdscr.getmaxyx()
+        if (height, width) == (self.height, self.width):
+            return self
+        return Layout(height, width)
+
+    def box_h(self, show_preview):
+        return self.preview_box_h if show_preview else self.full_box_h
+
+    def panes(self, show_preview, show_help):
+        """Pane boxes for Screen.build, by name: (y, x, height, width)."""
+        key = (show_preview, show_help)
+        if key not in self._panes:
+            panes = {
+                "title": (self.title_y, self.title_x, self.title_h, self.title_w),
+                "status": (self.status_y, 0, 1, self.width),
+            }
+            if show_help:
+                panes["help"] = (
+                    self.help_y,
+                    max(0, (self.width - self.help_w) // 2),
+                    min(len(HELP_LINES), self.status_y - self.help_y),
+                    min(self.help_w, self.width),
+                )
+            else:
+                panes["tabs"] = (self.tab_bar_y, 0, 1, self.width)
+                panes["list"] = (
+                    self.box_y,
+                    self.box_x,
+                    self.box_h(show_preview),
+                    self.box_w,
+                )
+                if show_preview and self.detail_h > 0:
+                    panes["preview"] = (
+                        self.detail_y,
+                        self.box_x,
+                        self.detail_h,
+                        self.box_w,
+                    )
+            self._panes[key] = panes
+        return self._panes[key]
+
+    def task_input(self, show_preview):
+        """(y, x, width, lines) of the new task prompt, over the list's end."""
+        lines = self.task_input_lines
+        y = self.box_y + self.box_h(show_preview) - lines - 1
+        return y, self.box_x, self.box_w, lines
+
+    def line_input(self):
+        """(y, x, width, lines) of one-line prompts near the bottom."""
+        return self.height - 4, 2, self.width - 4, 1
+
+    def notes_editor(self):
+        """(hint y, y, x, width, height) of the notes editor in the detail panel."""
+        return (
+            self.detail_y + 3,
+            self.detail_y + 4,
+            self.box_x,
+            self.box_w,
+            self.detail_h - 5,
+        )
+
+
+def draw_title(win):
+    for i, line in enumerate(ASCII_TITLE):
+        put(win, i, 0, line, curses.color_pair(3) | curses.A_BOLD)
+
+
+def draw_help(win):
+    # The pane is placed centered by Layout
+    for i, line in enumerate(HELP_LINES[: win.getmaxyx()[0]]):
+        put(win, i, 0, line, curses.color_pair(2) | curses.A_BOLD)
+
+
+def draw_tab_bar(win, tab_categories, current_tab, badges):
+    # Calculate total width to center the tab bar
+    tab_strs = [
+        f" {cat} {done}/{total} " for cat, (done, total) in zip(tab_categories, badges)
+    ]
+    total_width = sum(len(s) for s in tab_strs) + (len(tab_strs) - 1)
+    current_x = max(0, (win.getmaxyx()[1] - total_width) // 2)
+
+    for i, display_str in enumerate(tab_strs):
+        attr = curses.color_pair(2) | curses.A_BOLD
+        if i == current_tab:
+            attr = curses.A_REVERSE
+        put(win, 0, current_x, display_str, attr)
+        current_x += len(display_str) + 1
+
+
+def draw_status(win, text):
+    put(
+        win,
+        0,
+        max(0, (win.getmaxyx()[1] - len(text)) // 2),
+        text,
+        curses.color_pair(4) | curses.A_BOLD,
+    )
+
+
+def task_list_rows(todos, current_index, box_h, box_w, wrap_cache):
+    """Build the rows of the task list pane as (x, text, attr) segments."""
+    prefix_w = 4  # "[ ] " / "[X] "
+    text_width = box_w
+
+    def line_count(i):
+        todo = todos[i]
+        return wrap_cache.line_count(
+            todo["id"], todo["text"], todo["text"], text_width - prefix_w
+        )
+
+    # SCROLL for tasks
+    max_visible = max(1, box_h)
+    if len(todos) > max_visible:
+        if current_index < max_visible // 2:
+            start = 0
+        elif current_index > len(todos) - (max_visible // 2):
+            start = len(todos) - max_visible
+        else:
+            start = current_index - max_visible // 2
+        # Wrapped tasks take several lines: keep the selected one fully visible
+        used = sum(line_count(i) for i in range(start, current_index + 1))
+        while start < current_index and used > max_visible:
+            used -= line_count(start)
+            start += 1
+    else:
+        start = 0
+
+    rows = [() for _ in range(box_h)]
+    if len(todos) == 0:
+        msg = "No tasks yet..."
+        rows[box_h // 2] = (
+            ((box_w - len(msg)) // 2, msg, curses.color_pair(2) | curses.A_BOLD),
+        )
+        return rows
+
+    display_line = 0
+    indent = "    "  # Indent for wrapped lines (same width as prefix)
+    end = start
+    truncated = False
+    while end < len(todos) and display_line < max_visible:
+        todo = todos[end]
+        prefix = "[X] " if todo["done"] else "[ ] "
+        attr = curses.A_REVERSE if end == current_index else 0
+        # Wrap the todo text
+        wrapped_lines = wrap_cache.wrap(
+            todo["id"], todo["text"], todo["text"], text_width - prefix_w
+        )
+        for line_idx, line_text in enumerate(wrapped_lines):
+            if display_line >= max_visible:
+                truncated = True
+                break
+            line = (prefix if line_idx == 0 else indent) + line_text
+            rows[display_line] = ((0, line[:text_width], attr),)
+            display_line += 1
+        end += 1
+
+    # Scroll indicators for tasks (on the right side)
+    indicator_attr = curses.color_pair(2) | curses.A_BOLD
+    if start > 0:
+        rows[0] += ((box_w - 1, "↑", indicator_attr),)
+    if truncated or end < len(todos):
+        rows[box_h - 1] += ((box_w - 1, "↓", indicator_attr),)
+    return rows
+
+
+def highlight_segments(marked):
+    """Split search-highlighted text into (text, highlighted) pieces."""
+    segments = []
+    highlighted = False
+    pos = 0
+    while pos < len(marked):
+        end = marked.find(HIGHLIGHT_END if highlighted else HIGHLIGHT_START, pos)
+        if end == -1:
+            end = len(marked)
+        if end > pos:
+            segments.append((marked[pos:end], highlighted))
+        highlighted = not highlighted
+        pos = end + 1
+    return segments
+
+
+def marked_lines(marked, width, max_lines):
+    """Lay highlighted text out on up to max_lines lines of width characters."""
+    lines = [[]]
+    if width <= 0:
+        return lines
+    used = 0
+    for text, highlighted in highlight_segments(marked.replace("\n", " ")):
+        while text:
+            if used == width:
+                if len(lines) == max_lines:
+                    return lines
+                lines.append([])
+                used = 0
+            piece, text = text[: width - used], text[width - used :]
+            lines[-1].append((piece, highlighted))
+            used += len(piece)
+    return lines
+
 
+def segment_row(x, segments, attr, highlight_attr):
+    row = []
+    for text, highlighted in segments:
+        row.append((x, text, highlight_attr if highlighted else attr))
+        x += len(text)
+    return tuple(row)
 
-def remove_deleted_category(cat):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("DELETE FROM deleted_categories WHERE name = ?", (cat,))
-    conn.commit()
-    conn.close()
 
+def search_rows(search, box_h, box_w):
+    """Build the task list pane rows showing search results."""
+    rows = [() for _ in range(box_h)]
+    if not search.results:
+        msg = "No matches" if search.query.strip() else search.placeholder
+        rows[box_h // 2] = (
+            ((box_w - len(msg)) // 2, msg, curses.color_pair(2) | curses.A_BOLD),
+        )
+        return rows
+    start = max(0, search.index - box_h + 1)
+    for line, i in enumerate(range(start, min(start + box_h, len(search.results)))):
+        result = search.results[i]
+        prefix = "[X] " if result["done"] else "[ ] "
+        category = f" {result['category']}"
+        if len(category) > box_w // 3:
+            # Long category names must leave room for the task itself
+            category = category[: box_w // 3 - 1] + "…"
+        attr = curses.A_REVERSE if i == search.index else 0
+        text_w = max(0, box_w - len(prefix) - len(category) - 1)
+        segments = marked_lines(result["text"], text_w, 1)[0]
+        rows[line] = (
+            ((0, prefix, attr),)
+            + segment_row(
+                len(prefix), segments, attr, attr | curses.color_pair(2) | curses.A_BOLD
+            )
+            + ((box_w - len(category) - 1, category, curses.color_pair(4)),)
+        )
+    return rows
 
-def delete_todos_by_category(category):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("DELETE FROM todos WHERE category = ?", (category,))
-    conn.commit()
-    conn.close()
 
+def draw_search_preview(
+    win,
+    result,
+    no_notes="(no matches in notes)",
+    guide=" ↑/↓: select | Enter: open | Esc: close ",
+):
+    detail_panel_h, detail_w = win.getmaxyx()
+    if result is None:
+        return
+    highlight_attr = curses.color_pair(2) | curses.A_BOLD
+    task_label = "Task: "
+    put(win, 0, 0, task_label, curses.color_pair(3) | curses.A_BOLD)
+    title_lines = marked_lines(result["text"], detail_w - len(task_label), 2)
+    for i, segments in enumerate(title_lines):
+        for x, text, attr in segment_row(len(task_label), segments, 0, highlight_attr):
+            put(win, i, x, text, attr)
+    category_y = len(title_lines)
+    category_label = "Category: "
+    put(win, category_y, 0, category_label, curses.color_pair(4) | curses.A_BOLD)
+    put(win, category_y, len(category_label), result["category"])
+    put(win, category_y + 1, 0, H * detail_w, curses.color_pair(1))
+    notes_y = category_y + 2
+    if result["snippet"]:
+        put(win, notes_y, 0, "Notes:", curses.color_pair(2) | curses.A_BOLD)
+        note_lines = marked_lines(
+            result["snippet"], detail_w, max(1, detail_panel_h - notes_y - 2)
+        )
+        for i, segments in enumerate(note_lines):
+            for x, text, attr in segment_row(0, segments, 0, highlight_attr):
+                put(win, notes_y + 1 + i, x, text, attr)
+    else:
+        put(win, notes_y, 0, no_notes, curses.color_pair(1))
+    put(
+        win,
+        detail_panel_h - 1,
+        (detail_w - len(guide)) // 2,
+        guide,
+        curses.color_pair(1),
+    )
 
-def wrap_text(text, width):
-    """Wrap text to fit within a given width, returning a list of lines."""
-    if width <= 0:
-        return [text]
-    lines = []
-    while len(text) > width:
-        # Find the last space within the width limit
-        split_at = text.rfind(" ", 0, width)
-        if split_at == -1:
-            # No space found, hard break at width
-            split_at = width
-        lines.append(text[:split_at])
-        text = text[split_at:].lstrip()
-    if text:
-        lines.append(text)
-    return lines if lines else [""]
 
+def iter_note_lines(notes, width):
+    """Yield the wrapped display lines of a note, wrapping only as far as consumed."""
+    pos = 0
+    while True:
+        end = notes.find("\n", pos)
+        note_line = notes[pos:] if end == -1 else notes[pos:end]
+        if note_line:
+            yield from iter_wrapped(note_line, width)
+        else:
+            yield ""
+        if end == -1:
+            return
+        pos = end + 1
 
-def get_wrapped_input(stdscr, start_y, start_x, width, max_lines, prompt=""):
-    """Get user input with text wrapping support."""
-    curses.curs_set(2)  # Block cursor
-    text = ""
 
-    while True:
-        # Clear the input area
-        for i in range(max_lines):
-            stdscr.addstr(start_y + i, start_x, " " * width)
+class NoteLayout:
+    """Wrapped lines of one note, produced incrementally as the preview scrolls."""
 
-        # Display prompt and wrapped text
-        full_text = prompt + text
-        wrapped = wrap_text(full_text, width)
+    def __init__(self, notes, width):
+        self.width = width
+        self._source = iter_note_lines(notes, width) if notes else iter(())
+        self.lines = []
+        self.complete = False
 
-        for i, line in enumerate(wrapped[:max_lines]):
-            stdscr.addstr(start_y + i, start_x, line)
+    def window(self, start, count):
+        """Return (start, lines, more) for count lines from start.
 
-        # Position cursor at the end of text
-        if wrapped:
-            cursor_line = min(len(wrapped) - 1, max_lines - 1)
-            cursor_col = len(wrapped[cursor_line])
-            stdscr.move(start_y + cursor_line, start_x + cursor_col)
+        Only lines up to one past the window are ever wrapped. start is
+        clamped so the window stays within the note once its end is known.
+        """
+        while not self.complete and len(self.lines) <= start + count:
+            line = next(self._source, None)
+            if line is None:
+                self.complete = True
+            else:
+                self.lines.append(line)
+        if self.complete:
+            start = max(0, min(start, len(self.lines) - count))
+        return start, self.lines[start : start + count], len(self.lines) > start + count
 
-        stdscr.refresh()
-        key = stdscr.getch()
 
-        if key == ord("\n"):  # Enter - submit
-            break
-        elif key == 27:  # Escape - cancel
-            text = ""
-            break
-        elif key in (curses.KEY_BACKSPACE, 127, 8):  # Backspace
-            if text:
-                text = text[:-1]
-        elif key >= 32 and key <= 126:  # Printable ASCII
-            text += chr(key)
+def draw_preview(win, todo, title_lines, notes_lines, preview_scroll, more_notes):
+    detail_panel_h, detail_w = win.getmaxyx()
+    if todo is None:
+        # No task selected
+        msg = "Select a task to view details"
+        put(
+            win,
+            detail_panel_h // 2,
+            (detail_w - len(msg)) // 2,
+            msg,
+            curses.color_pair(1),
+        )
+        return
 
-    curses.curs_set(0)  # Hide cursor
-    return text
+    # Show task name at top of detail panel (with wrapping)
+    task_label = "Task: "
+    put(win, 0, 0, task_label, curses.color_pair(3) | curses.A_BOLD)
+    task_display_lines = 0
+    for i, line in enumerate(title_lines[:2]):  # Max 2 lines for task title
+        if i == 0:
+            put(win, 0, len(task_label), line)
+        else:
+            put(win, i, 0, " " * len(task_label) + line)
+        task_display_lines += 1
 
+    # Created date
+    created_y = task_display_lines
+    created_label = "Created: "
+    put(win, created_y, 0, created_label, curses.color_pair(4) | curses.A_BOLD)
+    put(win, created_y, len(created_label), todo.get("created_at") or "(unknown)")
 
-def edit_multiline_text(stdscr, start_y, start_x, width, height, initial_text=""):
-    """Edit multiline text with basic navigation and text wrapping. Returns edited text or None if cancelled."""
-    curses.curs_set(2)  # Block cursor
-    lines = initial_text.split("\n") if initial_text else [""]
-    cursor_line = len(lines) - 1
-    cursor_col = len(lines[cursor_line])
-    scroll_offset = 0
+    # Separator line
+    sep_y = created_y + 1
+    put(win, sep_y, 0, H * detail_w, curses.color_pair(1))
 
-    while True:
-        # Build wrapped display lines with mapping back to original lines
-        display_lines = []  # List of (original_line_idx, text, start_col)
-        for line_idx, line in enumerate(lines):
-            if len(line) == 0:
-                display_lines.append((line_idx, "", 0))
-            else:
-                col = 0
-                while col < len(line):
-                    chunk = line[col : col + width]
-                    display_lines.append((line_idx, chunk, col))
-                    col += width
-                if len(line) % width == 0 and len(line) > 0:
-                    # Line exactly fills width, no extra empty line needed
-                    pass
-
-        # Find which display line the cursor is on
-        cursor_display_line = 0
-        for i, (line_idx, text, start_col) in enumerate(display_lines):
-            if line_idx == cursor_line:
-                if start_col <= cursor_col < start_col + width:
-                    cursor_display_line = i
-                    break
-                elif cursor_col >= start_col:
-                    cursor_display_line = i  # Keep updating until we pass it
+    # Notes section with timestamp
+    note_updated_at = todo.get("note_updated_at", "")
+    if note_updated_at:
+        notes_label = f"Notes: (edited {note_updated_at}) - press 'n' to edit"
+    else:
+        notes_label = "Notes: (press 'n' to edit)"
+    put(win, sep_y + 1, 0, notes_label[:detail_w], curses.color_pair(2) | curses.A_BOLD)
 
-        # Adjust scroll to keep cursor visible
-        if cursor_display_line < scroll_offset:
-            scroll_offset = cursor_display_line
-        elif cursor_display_line >= scroll_offset + height:
-            scroll_offset = cursor_display_line - height + 1
+    # Display notes with scrolling (controlled by preview_scroll via Alt-j/Alt-k)
+    notes_start_y = sep_y + 2
+    max_notes_lines = detail_panel_h - notes_start_y
+    if notes_lines:
+        for i, line in enumerate(notes_lines):
+            put(win, notes_start_y + i, 0, line)
 
-        # Clear and draw the text area
-        for i in range(height):
-            stdscr.addstr(start_y + i, start_x, " " * width)
-            disp_idx = scroll_offset + i
-            if disp_idx < len(display_lines):
-                _, text, _ = display_lines[disp_idx]
-                stdscr.addstr(start_y + i, start_x, text)
+        # Scroll indicators for notes (on the right side)
+        if preview_scroll > 0:
+            put(
+                win,
+                notes_start_y,
+                detail_w - 1,
+                "↑",
+                curses.color_pair(2) | curses.A_BOLD,
+            )
+        if more_notes:
+            put(
+                win,
+                notes_start_y + max_notes_lines - 1,
+                detail_w - 1,
+                "↓",
+                curses.color_pair(2) | curses.A_BOLD,
+            )
+    else:
+        put(win, notes_start_y, 0, "(no notes)", curses.color_pair(1))
 
-        # Position cursor
-        screen_cursor_line = cursor_display_line - scroll_offset
-        _, _, start_col = (
-            display_lines[cursor_display_line] if display_lines else (0, "", 0)
-        )
-        screen_cursor_col = cursor_col - start_col
-        stdscr.move(start_y + screen_cursor_line, start_x + screen_cursor_col)
+    # Mini guide embedded in the bottom border of detail panel (centered)
+    guide_text = " Alt-j/k: scroll | Alt-p: toggle "
+    put(
+        win,
+        detail_panel_h - 1,
+        (detail_w - len(guide_text)) // 2,
+        guide_text,
+        curses.color_pair(1),
+    )
 
-        stdscr.refresh()
-        key = stdscr.getch()
 
-        if key == 27:  # Escape - cancel
-            curses.curs_set(0)
-            return None
-        elif key == 6:  # Ctrl+F - save and finish
-            curses.curs_set(0)
-            return "\n".join(lines)
-        elif key == ord("\n"):  # Enter - new line
-            # Split line at cursor
-            rest = lines[cursor_line][cursor_col:]
-            lines[cursor_line] = lines[cursor_line][:cursor_col]
-            lines.insert(cursor_line + 1, rest)
-            cursor_line += 1
-            cursor_col = 0
-        elif key in (curses.KEY_BACKSPACE, 127, 8):  # Backspace
-            if cursor_col > 0:
-                lines[cursor_line] = (
-                    lines[cursor_line][: cursor_col - 1]
-                    + lines[cursor_line][cursor_col:]
-                )
-                cursor_col -= 1
-            elif cursor_line > 0:
-                # Merge with previous line
-                cursor_col = len(lines[cursor_line - 1])
-                lines[cursor_line - 1] += lines[cursor_line]
-                lines.pop(cursor_line)
-                cursor_line -= 1
-        elif key == curses.KEY_DC:  # Delete
-            if cursor_col < len(lines[cursor_line]):
-                lines[cursor_line] = (
-                    lines[cursor_line][:cursor_col]
-                    + lines[cursor_line][cursor_col + 1 :]
-                )
-            elif cursor_line < len(lines) - 1:
-                # Merge with next line
-                lines[cursor_line] += lines[cursor_line + 1]
-                lines.pop(cursor_line + 1)
-        elif key == curses.KEY_UP:
-            if cursor_line > 0:
-                cursor_line -= 1
-                cursor_col = min(cursor_col, len(lines[cursor_line]))
-        elif key == curses.KEY_DOWN:
-            if cursor_line < len(lines) - 1:
-                cursor_line += 1
-                cursor_col = min(cursor_col, len(lines[cursor_line]))
-        elif key == curses.KEY_LEFT:
-            if cursor_col > 0:
-                cursor_col -= 1
-            elif cursor_line > 0:
-                cursor_line -= 1
-                cursor_col = len(lines[cursor_line])
-        elif key == curses.KEY_RIGHT:
-            if cursor_col < len(lines[cursor_line]):
-                cursor_col += 1
-            elif cursor_line < len(lines) - 1:
-                cursor_line += 1
-                cursor_col = 0
-        elif key == curses.KEY_HOME:
-            cursor_col = 0
-        elif key == curses.KEY_END:
-            cursor_col = len(lines[cursor_line])
-        elif key >= 32 and key <= 126:  # Printable ASCII
-            lines[cursor_line] = (
-                lines[cursor_line][:cursor_col]
-                + chr(key)
-                + lines[cursor_line][cursor_col:]
-            )
-            cursor_col += 1
+def update_task_preview(pane, todo, store, wrap_cache, preview_scroll):
+    """Show todo (or a placeholder) in the preview pane.
 
-    curses.curs_set(0)
-    return "\n".join(lines)
+    Returns preview_scroll clamped to the length of the task's notes.
+    """
+    if todo is None:
+        pane.update("no task", draw_preview, None, [], [], 0, False)
+        return preview_scroll
+    detail_panel_h, detail_w = pane.height, pane.width
+    title_lines = wrap_cache.wrap(
+        todo["id"], todo["text"], todo["text"], detail_w - len("Task: ")
+    )
+    # Rows above the notes: up to 2 title lines, created, separator, label
+    max_notes_lines = detail_panel_h - (min(2, len(title_lines)) + 3)
+    # Only the visible window of the note is wrapped; this also
+    # clamps preview_scroll to the valid range
+    note_layout = store.note_layout(todo["id"], detail_w)
+    preview_scroll, notes_lines, more_notes = note_layout.window(
+        max(0, preview_scroll), max_notes_lines
+    )
+    pane.update(
+        (
+            todo["id"],
+            todo["text"],
+            todo.get("created_at"),
+            todo.get("note_updated_at"),
+            tuple(notes_lines),
+            more_notes,
+            preview_scroll,
+        ),
+        draw_preview,
+        todo,
+        title_lines,
+        notes_lines,
+        preview_scroll,
+        more_notes,
+    )
+    return preview_scroll
 
 
-def get_all_categories():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT DISTINCT category FROM todos")
-    cats = [row[0] for row in c.fetchall()]
-    c.execute("SELECT name FROM deleted_categories")
-    deleted = set(row[0] for row in c.fetchall())
-    conn.close()
-    filtered = [cat for cat in cats if cat not in deleted]
-    return filtered if filtered else ["General"]
-
-
-def main(stdscr):
+def main(stdscr, profiler=None):
     curses.curs_set(0)
     stdscr.clear()
     curses.start_color()
@@ -356,9 +3311,23 @@ def main(stdscr):
     curses.init_pair(4, curses.COLOR_MAGENTA, -1)
 
     init_db()
+    if profiler is not None:
+        get_db().conn = TimedConnection(get_db().conn, profiler)
+    # Task edits are saved in the background, and flushed before exiting
+    writer = WriteQueue(get_db().path)
+    atexit.register(writer.close)
+    # Tabs are loaded the first time they are shown
+    store = TaskStore(get_db(), writer=writer)
+    # Finish emptying tabs closed in an earlier session
+    purger = Purger(get_db().path)
+    for cat in get_db().pending_purges():
+        purger.purge(cat)
+    archiver = None
+    if ARCHIVE_AFTER_DAYS > 0:
+        archiver = Archiver(get_db().path, archive_cutoff(ARCHIVE_AFTER_DAYS))
+        archiver.start()
     # Structure for tabs
     tab_categories = get_all_categories()
-    tabs = [load_todos(cat) for cat in tab_categories]
     current_tab = 0
     max_tabs = 10
     current_indices = [0 for _ in tab_categories]
@@ -368,40 +3337,30 @@ def main(stdscr):
     preview_scroll = 0  # Scroll offset within preview pane
 
     show_help = False
-    help_lines = [
-        "Available commands:",
-        "",
-        "Navigation:",
-        "   ↑↓ / Ctrl+P/N  Navigate between tasks",
-        "   Enter          Mark/unmark task (confirm)",
-        "   ←/→            Switch tab",
-        "Preview pane:",
-        "   Alt+P          Toggle preview pane",
-        "   Alt+J/K        Scroll preview down/up",
-        "Task management:",
-        "   a              Add new task",
-        "   d              Delete selected task",
-        "   n              Edit notes for task",
-        "Tabs:",
-        "   Ctrl+T         New tab",
-        "   Ctrl+W         Close tab",
-        "Other:",
-        "   h              Show/hide help",
-        "   q              Quit program",
-        "In notes editor:",
-        "   Ctrl+F         Save notes",
-        "   Esc            Cancel editing",
-    ]
+    picker = None  # Active '/' search or fuzzy finder, if any
+    notice = None  # One-off message for the status line, cleared by the next key
+    screen = Screen(stdscr)
+    layout = Layout(*stdscr.getmaxyx())
+    wrap_cache = WrapCache()
 
     while True:
-        stdscr.clear()
-        height, width = stdscr.getmaxyx()
+        failed = writer.take_error()
+        if failed is not None:
+            store.reload()  # show what was actually saved
+            notice = f"Could not save changes: {failed}"
+        elif writer.take_caught_up():
+            store.reload()  # read again what was read without queued writes
+        if profiler is not None:
+            profiler.phase("input")  # handling the key that started the frame
+        height, width = layout.height, layout.width
 
         # Minimum resolution check
-        min_width = 80
-        min_height = 30
-        if width < min_width or height < min_height:
-            msg = f"Current resolution: {width}x{height} | Minimum: {min_width}x{min_height}"
+        if layout.too_small:
+            screen.reset()
+            msg = (
+                f"Current resolution: {width}x{height} |"
+                f" Minimum: {layout.min_width}x{layout.min_height}"
+            )
             stdscr.clear()
             msg_x = max(0, min(width - 1, (width - len(msg)) // 2))
             msg_y = min(height - 1, height // 2)
@@ -416,291 +3375,181 @@ def main(stdscr):
                 pass  # ignores if the screen is too small to even draw
             stdscr.refresh()
             key = stdscr.getch()
+            if profiler is not None:
+                profiler.start_frame(key)
+            if key == curses.KEY_RESIZE:
+                layout = layout.fit(stdscr)
             if key in (ord("q"), 3):  # 'q', Ctrl+C
                 break
             continue
 
-        # Title
-        title_w = max(len(line) for line in ASCII_TITLE)
-        title_h = len(ASCII_TITLE)
-        title_x = max(0, (width - title_w) // 2)
-        title_y = 1
-        # Only draws if it fits on screen
-        if title_y + title_h < height and title_x + title_w < width:
-            for i, line in enumerate(ASCII_TITLE):
-                if i + title_y < height and title_x < width:
-                    stdscr.addstr(
-                        title_y + i,
-                        title_x,
-                        line[: max(0, width - title_x)],
-                        curses.color_pair(3) | curses.A_BOLD,
-                    )
+        box_h = layout.box_h(show_preview)
+        box_w = layout.box_w
+        wrap_cache.set_width(width)
+        geometry = (height, width, show_preview, show_help)
+        if geometry != screen.geometry:
+            screen.build(geometry, layout.panes(show_preview, show_help))
+        panes = screen.panes
+        if profiler is not None:
+            profiler.phase("layout")
 
+        panes["title"].update((), draw_title)
+        counts = store.counts()
+        if store.tabs_changed:
+            # Another instance created, closed or reopened a tab
+            store.tabs_changed = False
+            positions = dict(zip(tab_categories, current_indices))
+            shown = tab_categories[current_tab]
+            tab_categories = get_all_categories()
+            current_indices = [positions.get(cat, 0) for cat in tab_categories]
+            if shown in tab_categories:
+                current_tab = tab_categories.index(shown)
+            else:
+                current_tab = min(current_tab, len(tab_categories) - 1)
+        badges = tuple(counts.get(cat, (0, 0)) for cat in tab_categories)
         if show_help:
-            # Centered help screen, but slightly lower
-            help_w = max(len(line) for line in help_lines)
-            help_h = len(help_lines)
-            help_x = (width - help_w) // 2
-            help_y = max(2, (height - help_h) // 2 + height // 10)  # offset downwards
-            for i, line in enumerate(help_lines):
-                stdscr.addstr(
-                    help_y + i, help_x, line, curses.color_pair(2) | curses.A_BOLD
-                )
+            panes["help"].update((), draw_help)
+        elif picker is not None:
+            panes["tabs"].update(
+                (tuple(tab_categories), current_tab, badges),
+                draw_tab_bar,
+                tab_categories,
+                current_tab,
+                badges,
+            )
+            picker.refresh()
+            panes["list"].set_lines(search_rows(picker, box_h, box_w))
+            if "preview" in panes:
+                result = picker.selected()
+                if isinstance(picker, Search):
+                    panes["preview"].update(
+                        ("search", result), draw_search_preview, result
+                    )
+                elif isinstance(picker, ArchiveView):
+                    panes["preview"].update(
+                        ("archive", result),
+                        draw_search_preview,
+                        result,
+                        "(no notes)",
+                        " ↑/↓: select | Esc: close ",
+                    )
+                else:
+                    # The finder previews the highlighted task itself
+                    preview_scroll = update_task_preview(
+                        panes["preview"],
+                        get_db().get_todo(result["id"]) if result else None,
+                        store,
+                        wrap_cache,
+                        preview_scroll,
+                    )
         else:
-            # Tabs at the top
-            tab_bar_y = title_y + title_h
-            x_offset = 0
-
-            # Calculate total width to center the tab bar
-            tab_strs = [f" {cat} " for cat in tab_categories]
-            total_width = sum(len(s) for s in tab_strs) + (len(tab_strs) - 1)
-            current_x = max(0, (width - total_width) // 2)
-
-            for i, cat in enumerate(tab_categories):
-                display_str = f" {cat} "
-                attr = curses.color_pair(2) | curses.A_BOLD
-                if i == current_tab:
-                    attr = curses.A_REVERSE
-                stdscr.addstr(tab_bar_y, current_x, display_str, attr)
-                current_x += len(display_str) + 1
-
-            # Calculate available space for task list and detail panel
-            available_height = (
-                height - (title_y + title_h) - 6
-            )  # Leave room for help hint
-            if show_preview:
-                box_h = 8  # Shorter fixed height for task list when preview is shown
-                detail_panel_h = max(
-                    10, available_height - box_h - 1
-                )  # Detail panel gets remaining space
-            else:
-                box_h = (
-                    available_height  # Task list takes all space when preview is hidden
-                )
-                detail_panel_h = 0
-
-            # Main task list
-            box_w = title_w
-            box_x = title_x
-            box_y = title_y + title_h + 2
+            panes["tabs"].update(
+                (tuple(tab_categories), current_tab, badges),
+                draw_tab_bar,
+                tab_categories,
+                current_tab,
+                badges,
+            )
 
-            todos = tabs[current_tab]
+            todos = store.todos(tab_categories[current_tab])
             # Ensures the selected index is within the list size
             if current_indices[current_tab] >= len(todos):
                 current_indices[current_tab] = max(0, len(todos) - 1)
             current_index = current_indices[current_tab]
-            # SCROLL for tasks
-            max_visible = max(1, box_h)
-            if len(todos) > max_visible:
-                if current_index < max_visible // 2:
-                    start = 0
-                elif current_index > len(todos) - (max_visible // 2):
-                    start = len(todos) - max_visible
-                else:
-                    start = current_index - max_visible // 2
-                end = start + max_visible
-            else:
-                start = 0
-                end = len(todos)
-            if len(todos) == 0:
-                msg = "No tasks yet..."
-                msg_y = box_y + (box_h // 2)
-                msg_x = box_x + ((box_w - len(msg)) // 2)
-                stdscr.addstr(msg_y, msg_x, msg, curses.color_pair(2) | curses.A_BOLD)
-            elif len(todos) > 0:
-                display_line = 0
-                text_width = box_w  # Account for border and padding
-                indent = "    "  # Indent for wrapped lines (same width as prefix)
-                for idx, i in enumerate(range(start, end)):
-                    if 0 <= i < len(todos) and display_line < max_visible:
-                        todo = todos[i]
-                        prefix = "[X] " if todo["done"] else "[ ] "
-                        attr = curses.A_REVERSE if i == current_index else 0
-                        # Wrap the todo text
-                        wrapped_lines = wrap_text(
-                            todo["text"], text_width - len(prefix)
-                        )
-                        for line_idx, line_text in enumerate(wrapped_lines):
-                            if display_line >= max_visible:
-                                break
-                            if line_idx == 0:
-                                line = prefix + line_text
-                            else:
-                                line = indent + line_text
-                            stdscr.addstr(
-                                box_y + display_line, box_x, line[:text_width], attr
-                            )
-                            display_line += 1
-            # Scroll indicators for tasks (on the right side)
-            if start > 0:
-                stdscr.addstr(
-                    box_y, box_x + box_w - 1, "↑", curses.color_pair(2) | curses.A_BOLD
-                )
-            if end < len(todos):
-                stdscr.addstr(
-                    box_y + box_h - 1,
-                    box_x + box_w - 1,
-                    "↓",
-                    curses.color_pair(2) | curses.A_BOLD,
-                )
-
-            # Detail panel below task list (only if preview is enabled)
-            if show_preview and detail_panel_h > 0:
-                detail_y = box_y + box_h + 1
-                detail_w = box_w
-                detail_x = box_x
-
-            if (
-                show_preview
-                and detail_panel_h > 0
-                and len(todos) > 0
-                and 0 <= current_index < len(todos)
-            ):
-                selected_todo = todos[current_index]
-                detail_text_w = detail_w
-
-                # Show task name at top of detail panel (with wrapping)
-                task_label = "Task: "
-                task_text = selected_todo["text"]
-                stdscr.addstr(
-                    detail_y, detail_x, task_label, curses.color_pair(3) | curses.A_BOLD
-                )
-
-                # Wrap the task title
-                task_wrapped = wrap_text(task_text, detail_text_w - len(task_label))
-                task_display_lines = 0
-                for i, line in enumerate(
-                    task_wrapped[:2]
-                ):  # Max 2 lines for task title
-                    if i == 0:
-                        stdscr.addstr(detail_y, detail_x + len(task_label), line)
-                    else:
-                        stdscr.addstr(
-                            detail_y + i, detail_x, " " * len(task_label) + line
-                        )
-                    task_display_lines += 1
-
-                # Created date
-                created_y = detail_y + task_display_lines
-                created_label = "Created: "
-                created_at = selected_todo.get("created_at", "")
-                if created_at:
-                    stdscr.addstr(
-                        created_y,
-                        detail_x,
-                        created_label,
-                        curses.color_pair(4) | curses.A_BOLD,
-                    )
-                    stdscr.addstr(created_y, detail_x + len(created_label), created_at)
-                else:
-                    stdscr.addstr(
-                        created_y,
-                        detail_x,
-                        created_label,
-                        curses.color_pair(4) | curses.A_BOLD,
-                    )
-                    stdscr.addstr(created_y, detail_x + len(created_label), "(unknown)")
+            store.focus(tab_categories[current_tab], current_index)
+            panes["list"].set_lines(
+                task_list_rows(todos, current_index, box_h, box_w, wrap_cache)
+            )
 
-                # Separator line
-                sep_y = created_y + 1
-                stdscr.addstr(
-                    sep_y, detail_x, H * (detail_text_w), curses.color_pair(1)
+            if "preview" in panes:
+                selected_todo = None
+                if len(todos) > 0 and 0 <= current_index < len(todos):
+                    selected_todo = todos[current_index]
+                preview_scroll = update_task_preview(
+                    panes["preview"], selected_todo, store, wrap_cache, preview_scroll
                 )
 
-                # Notes section with timestamp
-                note_updated_at = selected_todo.get("note_updated_at", "")
-                if note_updated_at:
-                    notes_label = (
-                        f"Notes: (edited {note_updated_at}) - press 'n' to edit"
-                    )
-                else:
-                    notes_label = "Notes: (press 'n' to edit)"
-                # Truncate if too long
-                notes_label = notes_label[:detail_text_w]
-                stdscr.addstr(
-                    sep_y + 1,
-                    detail_x,
-                    notes_label,
-                    curses.color_pair(2) | curses.A_BOLD,
-                )
+        # Minimal help command
+        if picker is not None:
+            status = picker.prompt()
+        else:
+            status = notice or (WRITER_BEHIND if writer.behind() else HELP_HINT)
+            view = store.view(tab_categories[current_tab])
+            if view != "all":
+                status = f"{TASK_VIEWS[view]['label']}  ·  {status}"
+        if profiler is not None:
+            status = f"{status}  ·  {profiler.summary()}"
+        panes["status"].update(status, draw_status, status)
 
-                # Calculate notes area
-                notes_start_y = sep_y + 2
-                max_notes_lines = detail_panel_h - (notes_start_y - detail_y)
-
-                # Build all wrapped notes lines
-                notes = selected_todo.get("notes", "")
-                all_notes_lines = []
-                if notes:
-                    for note_line in notes.split("\n"):
-                        wrapped = (
-                            wrap_text(note_line, detail_text_w) if note_line else [""]
-                        )
-                        all_notes_lines.extend(wrapped)
-
-                # Display notes with scrolling (controlled by preview_scroll via Alt-j/Alt-k)
-                if all_notes_lines:
-                    total_notes_lines = len(all_notes_lines)
-                    # Clamp preview_scroll to valid range
-                    max_scroll = max(0, total_notes_lines - max_notes_lines)
-                    if preview_scroll > max_scroll:
-                        preview_scroll = max_scroll
-                    if preview_scroll < 0:
-                        preview_scroll = 0
-
-                    notes_start = preview_scroll
-                    notes_end = min(notes_start + max_notes_lines, total_notes_lines)
-
-                    for i, line in enumerate(all_notes_lines[notes_start:notes_end]):
-                        stdscr.addstr(notes_start_y + i, detail_x, line)
-
-                    # Scroll indicators for notes (on the right side)
-                    if notes_start > 0:
-                        stdscr.addstr(
-                            notes_start_y,
-                            detail_x + detail_w - 1,
-                            "↑",
-                            curses.color_pair(2) | curses.A_BOLD,
-                        )
-                    if notes_end < total_notes_lines:
-                        stdscr.addstr(
-                            notes_start_y + max_notes_lines - 1,
-                            detail_x + detail_w - 1,
-                            "↓",
-                            curses.color_pair(2) | curses.A_BOLD,
-                        )
-                else:
-                    stdscr.addstr(
-                        notes_start_y, detail_x, "(no notes)", curses.color_pair(1)
-                    )
+        if profiler is not None:
+            profiler.phase("draw")
+        curses.doupdate()
+        frame_drawn = time.perf_counter()
+        if profiler is not None:
+            profiler.phase("refresh")
+            profiler.end_frame()
+        # Without a key for a while, the next frame looks for other writers
+        stdscr.timeout(picker.poll_ms if picker is not None else IDLE_POLL_MS)
+        key = stdscr.getch()
+        if profiler is not None:
+            profiler.start_frame(key)
+        if key != -1:
+            notice = None
+        # Repeats of a held key this soon after the last frame join this one
+        repeat_wait = int(MIN_FRAME_MS - (time.perf_counter() - frame_drawn) * 1000)
 
-                # Mini guide embedded in the bottom border of detail panel (centered)
-                guide_text = " Alt-j/k: scroll | Alt-p: toggle "
-                guide_x = detail_x + (detail_w - len(guide_text)) // 2
-                guide_y = detail_y + detail_panel_h - 1
-                stdscr.addstr(guide_y, guide_x, guide_text, curses.color_pair(1))
+        if key == curses.KEY_RESIZE:
+            layout = layout.fit(stdscr)
+            continue
 
-            elif show_preview and detail_panel_h > 0:
-                # No task selected
-                msg = "Select a task to view details"
-                stdscr.addstr(
-                    detail_y + detail_panel_h // 2,
-                    detail_x + (detail_w - len(msg)) // 2,
-                    msg,
-                    curses.color_pair(1),
+        if picker is not None:
+            if key == -1:
+                # No key within poll_ms: a pause in typing
+                picker.idle()
+            elif key == 27:  # Esc (or an Alt sequence): close the picker
+                stdscr.nodelay(True)
+                stdscr.getch()
+                stdscr.nodelay(False)
+                picker.close()
+                picker = None
+            elif key in (curses.KEY_UP, 16):  # ↑ / Ctrl+P
+                steps = 1 + count_repeats(stdscr, (key,), repeat_wait)
+                picker.index = max(0, picker.index - steps)
+                preview_scroll = 0
+            elif key in (curses.KEY_DOWN, 14):  # ↓ / Ctrl+N
+                steps = 1 + count_repeats(stdscr, (key,), repeat_wait)
+                picker.index = max(
+                    0, min(len(picker.results) - 1, picker.index + steps)
                 )
-
-        # Minimal help command
-        help_hint = "Press 'h' for help"
-        stdscr.addstr(
-            height - 2,
-            max(0, (width - len(help_hint)) // 2),
-            help_hint,
-            curses.color_pair(4) | curses.A_BOLD,
-        )
-
-        stdscr.refresh()
-        key = stdscr.getch()
+                preview_scroll = 0
+            elif key in (curses.KEY_BACKSPACE, 127, 8):
+                picker.edit(picker.query[:-1])
+            elif key == ord("\n") and not isinstance(picker, ArchiveView):
+                # Open the selected result in its tab
+                result = picker.selected()
+                cat = result["category"] if result else None
+                if cat is not None and (
+                    cat in tab_categories or len(tab_categories) < max_tabs
+                ):
+                    if cat not in tab_categories:
+                        tab_categories.append(cat)
+                        current_indices.append(0)
+                    current_tab = tab_categories.index(cat)
+                    position = store.position(cat, result["id"])
+                    if position is None:
+                        # Hidden by the tab's view; show everything instead
+                        store.set_view(cat, "all")
+                        position = store.position(cat, result["id"])
+                    if position is None:
+                        # Deleted or archived since the results were read
+                        notice = "That task no longer exists"
+                    current_indices[current_tab] = position or 0
+                    preview_scroll = 0
+                    picker.close()
+                    picker = None
+            elif 32 <= key <= 126:
+                picker.edit(picker.query + chr(key))
+            continue
 
         # Handle Alt key combinations (ESC followed by another key)
         if key == 27:  # ESC - could be escape or start of Alt sequence
@@ -716,148 +3565,759 @@ def main(stdscr):
                 preview_scroll = 0  # Reset scroll when toggling
             elif next_key == ord("j"):
                 # Alt-j: scroll preview pane down
+                steps = 1 + count_repeats(stdscr, (27, next_key), repeat_wait)
                 if show_preview:
-                    preview_scroll += 1
+                    preview_scroll += steps
             elif next_key == ord("k"):
                 # Alt-k: scroll preview pane up
-                if show_preview and preview_scroll > 0:
-                    preview_scroll -= 1
+                steps = 1 + count_repeats(stdscr, (27, next_key), repeat_wait)
+                if show_preview:
+                    preview_scroll = max(0, preview_scroll - steps)
             continue  # Skip rest of key handling for Alt sequences
 
+        todos = store.todos(tab_categories[current_tab])
+
         # Ctrl-n / Ctrl-p for task list navigation (fzf-style)
         if key == 14:  # Ctrl+N - next task
-            if current_indices[current_tab] < len(tabs[current_tab]) - 1:
-                current_indices[current_tab] += 1
+            steps = 1 + count_repeats(stdscr, (key,), repeat_wait)
+            if current_indices[current_tab] < len(todos) - 1:
+                current_indices[current_tab] = min(
+                    len(todos) - 1, current_indices[current_tab] + steps
+                )
                 preview_scroll = 0  # Reset preview scroll when changing task
         elif key == 16:  # Ctrl+P - previous task
+            steps = 1 + count_repeats(stdscr, (key,), repeat_wait)
             if current_indices[current_tab] > 0:
-                current_indices[current_tab] -= 1
+                current_indices[current_tab] = max(
+                    0, current_indices[current_tab] - steps
+                )
                 preview_scroll = 0  # Reset preview scroll when changing task
 
         # Tab shortcuts
         elif key == 20:  # Ctrl+T
-            if len(tabs) < max_tabs:
+            if len(tab_categories) < max_tabs:
                 cat = get_wrapped_input(
-                    stdscr, height - 4, 2, width - 4, 1, "New category name: "
+                    stdscr, *layout.line_input(), "New category name: "
                 ).strip()
+                screen.invalidate()
+                layout = layout.fit(stdscr)
                 if cat and cat not in tab_categories:
-                    remove_deleted_category(cat)
+                    try:
+                        get_db().add_category(cat)
+                    except sqlite3.OperationalError as e:
+                        if not is_busy(e):
+                            raise
+                        notice = "The database is busy, try again"
+                        continue
                     tab_categories.append(cat)
-                    tabs.append(load_todos(cat))
                     current_indices.append(0)
-                    current_tab = len(tabs) - 1
+                    current_tab = len(tab_categories) - 1
         elif key == 23:  # Ctrl+W
-            if len(tabs) > 1:
-                add_deleted_category(tab_categories[current_tab])
-                delete_todos_by_category(tab_categories[current_tab])
-                tab_categories.pop(current_tab)
-                tabs.pop(current_tab)
+            if len(tab_categories) > 1:
+                # The tab goes now; its tasks are deleted in the background
+                try:
+                    get_db().close_category(tab_categories[current_tab])
+                except sqlite3.OperationalError as e:
+                    if not is_busy(e):
+                        raise
+                    notice = "The database is busy, try again"
+                    continue
+                purger.purge(tab_categories[current_tab])
+                store.drop(tab_categories.pop(current_tab))
                 current_indices.pop(current_tab)
-                if current_tab >= len(tabs):
-                    current_tab = len(tabs) - 1
-        elif key == 545:  # Ctrl+Left
-            if current_tab > 0:
-                current_tab -= 1
-        elif key == 560:  # Ctrl+Right
-            if current_tab < len(tabs) - 1:
-                current_tab += 1
-        elif key == curses.KEY_LEFT:
-            if current_tab > 0:
-                current_tab -= 1
-        elif key == curses.KEY_RIGHT:
-            if current_tab < len(tabs) - 1:
-                current_tab += 1
+                if current_tab >= len(tab_categories):
+                    current_tab = len(tab_categories) - 1
+        elif key in (545, curses.KEY_LEFT):  # Ctrl+Left / ←
+            steps = 1 + count_repeats(stdscr, (key,), repeat_wait)
+            current_tab = max(0, current_tab - steps)
+        elif key in (560, curses.KEY_RIGHT):  # Ctrl+Right / →
+            steps = 1 + count_repeats(stdscr, (key,), repeat_wait)
+            current_tab = min(len(tab_categories) - 1, current_tab + steps)
         elif key == ord("h"):
             show_help = not show_help
+        elif key == ord("v"):
+            # Next view of this tab, keeping the selected task if it is in it
+            cat = tab_categories[current_tab]
+            selected = todos[current_indices[current_tab]] if todos else None
+            view = VIEW_NAMES[(VIEW_NAMES.index(store.view(cat)) + 1) % len(VIEW_NAMES)]
+            store.set_view(cat, view)
+            position = None
+            if selected is not None:
+                position = store.position(cat, selected["id"])
+            current_indices[current_tab] = position or 0
+            preview_scroll = 0
+        elif key in (ord("/"), ord("f"), ord("A")):
+            # Pickers query the database themselves: save queued edits first
+            writer.flush()
+            if key == ord("/"):
+                picker = Search(get_db())
+            elif key == ord("f"):
+                picker = FuzzyFinder(get_db().path)
+            else:
+                picker = ArchiveView(get_db(), tab_categories[current_tab])
         elif key == ord("q"):
             break
         elif key == curses.KEY_UP:
+            steps = 1 + count_repeats(stdscr, (key,), repeat_wait)
             if current_indices[current_tab] > 0:
-                current_indices[current_tab] -= 1
+                current_indices[current_tab] = max(
+                    0, current_indices[current_tab] - steps
+                )
                 preview_scroll = 0  # Reset preview scroll when changing task
         elif key == curses.KEY_DOWN:
-            if current_indices[current_tab] < len(tabs[current_tab]) - 1:
-                current_indices[current_tab] += 1
+            steps = 1 + count_repeats(stdscr, (key,), repeat_wait)
+            if current_indices[current_tab] < len(todos) - 1:
+                current_indices[current_tab] = min(
+                    len(todos) - 1, current_indices[current_tab] + steps
+                )
                 preview_scroll = 0  # Reset preview scroll when changing task
-        elif key == ord("\n") and tabs[current_tab]:
-            todos = tabs[current_tab]
+        elif key == ord("\n") and todos:
             idx = current_indices[current_tab]
             if 0 <= idx < len(todos):
-                todos[idx]["done"] = not todos[idx]["done"]
-                update_todo_done(todos[idx]["id"], todos[idx]["done"])
-                # Update tab list
-                tabs[current_tab] = load_todos(tab_categories[current_tab])
+                store.toggle(tab_categories[current_tab], idx)
         elif key == ord("a"):
-            # Recalculate positions for input
-            box_y = title_y + title_h + 2
-            box_x = title_x
-            box_w = title_w
-            available_height = height - (title_y + title_h) - 6
-            box_h = available_height if not show_preview else 8
-
-            input_width = box_w
-            max_input_lines = 3
-            input_y = box_y + box_h - max_input_lines - 1
             text = get_wrapped_input(
-                stdscr, input_y, box_x, input_width, max_input_lines, "New task: "
+                stdscr, *layout.task_input(show_preview), "New task: "
             )
+            screen.invalidate()
+            layout = layout.fit(stdscr)
             if text.strip():
-                add_todo(text, tab_categories[current_tab])
-                tabs[current_tab] = load_todos(tab_categories[current_tab])
-                current_indices[current_tab] = len(tabs[current_tab]) - 1
-        elif key == ord("d") and tabs[current_tab]:
-            todos = tabs[current_tab]
+                cat = tab_categories[current_tab]
+                todo_id, index = store.add(cat, text)
+                if index is not None:
+                    current_indices[current_tab] = index
+                elif writer.behind():
+                    # Still queued: it shows up once the queue catches up
+                    notice = WRITER_BEHIND
+                elif todo_id is not None:
+                    label = TASK_VIEWS[store.view(cat)]["label"]
+                    notice = f"Task added; the {label} view does not show it"
+        elif key == ord("e"):
+            path = get_wrapped_input(
+                stdscr, *layout.line_input(), "Export tab to: "
+            ).strip()
+            screen.invalidate()
+            layout = layout.fit(stdscr)
+            if path and path != "-":
+                # Format and compression follow the extension, as in the CLI
+                path = os.path.expanduser(path)
+                if not writer.flush():
+                    # The file would miss the edits still queued
+                    notice = "The database is busy, export again later"
+                    continue
+                try:
+                    with open_export(path, path.endswith(".gz")) as out:
+                        count = export_todos(
+                            get_db(),
+                            out,
+                            export_format(path),
+                            tab_categories[current_tab],
+                        )
+                    notice = f"Exported {count} tasks to {path}"
+                except OSError as e:
+                    notice = f"Export failed: {e.strerror or e}"
+        elif key == ord("d") and todos:
             idx = current_indices[current_tab]
             if 0 <= idx < len(todos):
-                delete_todo(todos[idx]["id"])
-                tabs[current_tab] = load_todos(tab_categories[current_tab])
+                store.delete(tab_categories[current_tab], idx)
                 # Adjust index so it does not exceed list size
-                if current_indices[current_tab] >= len(tabs[current_tab]):
-                    current_indices[current_tab] = max(0, len(tabs[current_tab]) - 1)
-        elif key == ord("n") and tabs[current_tab]:
-            todos = tabs[current_tab]
+                if current_indices[current_tab] >= len(todos):
+                    current_indices[current_tab] = max(0, len(todos) - 1)
+        elif key == ord("n") and todos:
             idx = current_indices[current_tab]
             if 0 <= idx < len(todos):
                 # Edit notes for selected task
                 selected_todo = todos[idx]
-                current_notes = selected_todo.get("notes", "")
-
-                # Calculate detail panel position
-                available_height = height - (title_y + title_h) - 6
-                box_h = 8
-                detail_panel_h = max(10, available_height - box_h - 1)
-                detail_y = title_y + title_h + 2 + box_h + 1
-                detail_x = title_x
-                detail_w = title_w
-
-                notes_edit_y = detail_y + 4
-                notes_edit_h = detail_panel_h - 5
+                current_notes = store.notes(selected_todo["id"])
 
+                hint_y, edit_y, edit_x, edit_w, edit_h = layout.notes_editor()
                 edit_hint = "Editing notes... (Ctrl+F to save, Esc to cancel)"
                 stdscr.addstr(
-                    detail_y + 3,
-                    detail_x,
-                    edit_hint + " " * (detail_w - len(edit_hint)),
+                    hint_y,
+                    edit_x,
+                    edit_hint + " " * (edit_w - len(edit_hint)),
                     curses.color_pair(3) | curses.A_BOLD,
                 )
                 stdscr.refresh()
 
                 new_notes = edit_multiline_text(
-                    stdscr,
-                    notes_edit_y,
-                    detail_x,
-                    detail_w,
-                    notes_edit_h,
-                    current_notes,
+                    stdscr, edit_y, edit_x, edit_w, edit_h, current_notes
                 )
+                screen.invalidate()
+                layout = layout.fit(stdscr)
 
                 if new_notes is not None:
-                    update_todo_notes(selected_todo["id"], new_notes)
-                    tabs[current_tab] = load_todos(tab_categories[current_tab])
+                    store.set_notes(tab_categories[current_tab], idx, new_notes)
 
+    purger.close()
+    if archiver is not None:
+        archiver.close()
+    writer.close()
+    atexit.unregister(writer.close)
 
-if __name__ == "__main__":
+
+CLI_USAGE = """\
+usage: hydrotodo.py [--profile | command [options] [args]]
+
+Run without a command to open the interface. With --profile (or
+HYDROTODO_PROFILE=1, or =PATH) it shows frame timings in the status line
+and appends frame and SQL timings to ~/.hydrotodo-trace.jsonl (or PATH).
+
+commands:
+  add [-c CATEGORY] TEXT...     add a task and print its id
+  done [--undo] ID...           mark tasks as done, or pending with --undo
+  rm ID...                      delete tasks
+  ls [-c CATEGORY] [--done | --pending] [-f text|tsv|csv|jsonl]
+                                list tasks, streaming them as they are read
+  notes ID [TEXT | -]           print a task's notes, or replace them with
+                                TEXT or with stdin when given -
+  import [-f csv|jsonl] [-c CATEGORY] [--dedup] FILE | -
+                                add tasks from a CSV file with a header row or
+                                from JSON Lines, with the columns text,
+                                category, done, notes and created_at; --dedup
+                                skips tasks whose category and text exist
+  export [-f jsonl|csv|md] [-c CATEGORY] [--done | --pending]
+         [--since DATE] [--until DATE] [--gzip] [FILE | -]
+                                write tasks with their notes to FILE or stdout;
+                                the format and compression default from the
+                                FILE extension (e.g. tasks.csv.gz)
+  archive [--days N] [--vacuum]
+                                move tasks done over N days ago (default
+                                HYDROTODO_ARCHIVE_DAYS, or 30) to the archive;
+                                --vacuum then compacts the database file
+"""
+
+# Options each subcommand accepts: flag -> option name, or None for switches.
+# Parsed by hand because importing argparse alone costs more than a whole
+# command takes to run.
+CLI_OPTIONS = {
+    "add": {"-c": "category", "--category": "category"},
+    "done": {"--undo": None},
+    "rm": {},
+    "ls": {
+        "-c": "category",
+        "--category": "category",
+        "-f": "format",
+        "--format": "format",
+        "--done": None,
+        "--pending": None,
+    },
+    "notes": {},
+    "import": {
+        "-c": "category",
+        "--category": "category",
+        "-f": "format",
+        "--format": "format",
+        "--dedup": None,
+    },
+    "export": {
+        "-c": "category",
+        "--category": "category",
+        "-f": "format",
+        "--format": "format",
+        "--done": None,
+        "--pending": None,
+        "--since": "since",
+        "--until": "until",
+        "--gzip": None,
+    },
+    "archive": {"--days": "days", "--vacuum": None},
+}
+
+LS_FORMATS = ("text", "tsv", "csv", "jsonl")
+LS_FIELDS = ["id", "category", "done", "created_at", "text"]
+
+
+def parse_args(argv):
+    """Split argv into (command, options, args), raising ValueError on misuse."""
+    command = argv[0]
+    if command not in CLI_OPTIONS:
+        raise ValueError(f"unknown command {command!r}")
+    flags = CLI_OPTIONS[command]
+    options = {}
+    args = []
+    rest = iter(argv[1:])
+    for arg in rest:
+        if arg == "--":
+            args.extend(rest)
+        elif arg in flags:
+            name = flags[arg]
+            if name is None:
+                options[arg.lstrip("-")] = True
+            else:
+                value = next(rest, None)
+                if value is None:
+                    raise ValueError(f"{arg} needs a value")
+                options[name] = value
+        elif arg.startswith("-") and arg != "-":
+            raise ValueError(f"{command}: unknown option {arg}")
+        else:
+            args.append(arg)
+    return command, options, args
+
+
+def parse_ids(args):
+    if not args:
+        raise ValueError("missing task id")
+    try:
+        return [int(arg) for arg in args]
+    except ValueError:
+        raise ValueError(f"task ids must be numbers, got {' '.join(args)}")
+
+
+def list_todos(db, out, category=None, done=None, fmt="text"):
+    """Write tasks to out as they are read, so memory use stays flat."""
+    if fmt == "jsonl":
+        import json
+    elif fmt == "csv":
+        import csv
+
+        writer = csv.writer(out)
+        writer.writerow(LS_FIELDS)
+    elif fmt == "tsv":
+        out.write("\t".join(LS_FIELDS) + "\n")
+    for todo in db.iter_todos(category, done):
+        if fmt == "jsonl":
+            out.write(
+                json.dumps({k: todo[k] for k in LS_FIELDS}, ensure_ascii=False) + "\n"
+            )
+        elif fmt == "csv":
+            writer.writerow(
+                [
+                    todo["id"],
+                    todo["category"],
+                    int(todo["done"]),
+                    todo["created_at"],
+                    todo["text"],
+                ]
+            )
+        elif fmt == "tsv":
+            # Tabs and newlines inside the text would break the columns
+            text = todo["text"].replace("\t", " ").replace("\n", " ")
+            out.write(
+                f"{todo['id']}\t{todo['category']}\t{int(todo['done'])}"
+                f"\t{todo['created_at']}\t{text}\n"
+            )
+        else:
+            mark = "x" if todo["done"] else " "
+            out.write(f"{todo['id']:>6} [{mark}] {todo['category']}: {todo['text']}\n")
+
+
+IMPORT_FORMATS = ("csv", "jsonl")
+
+# Accepted spellings of the done column, lowercased
+IMPORT_DONE_VALUES = {
+    "": 0,
+    "0": 0,
+    "1": 1,
+    "false": 0,
+    "true": 1,
+    "no": 0,
+    "yes": 1,
+    " ": 0,
+    "x": 1,
+}
+
+
+# Columns read from import files, in the order import_row unpacks them
+IMPORT_COLUMNS = ("text", "category", "done", "notes", "created_at")
+
+
+def read_import_records(f, fmt):
+    """Yield (line number, values) from CSV (with a header) or JSON Lines.
+
+    values holds the IMPORT_COLUMNS in order, None where a column is absent,
+    or is a string saying why the line could not be read.
+    """
+    if fmt == "csv":
+        import csv
+        from operator import itemgetter
+
+        reader = csv.reader(f)
+        header = next(reader, [])
+        # Absent columns point one past the header at a padding cell
+        pad = len(header)
+        columns = [name.strip().lower() for name in header]
+        if "text" not in columns:
+            yield reader.line_num, "the CSV header has no text column"
+            return
+        pick = itemgetter(
+            *[columns.index(c) if c in columns else pad for c in IMPORT_COLUMNS]
+        )
+        for row in reader:
+            if not row:
+                continue
+            if len(row) != pad:
+                del row[pad:]
+                row.extend([""] * (pad - len(row)))
+            row.append(None)
+            yield reader.line_num, pick(row)
+    else:
+        import json
+
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_no, f"invalid JSON ({e})"
+                continue
+            if isinstance(record, dict):
+                yield line_no, tuple(record.get(c) for c in IMPORT_COLUMNS)
+            else:
+                yield line_no, "not a JSON object"
+
+
+def import_row(values, default_category, now, timestamp):
+    """Turn values read from an import file into a row for Database.import_todos.
+
+    Raises ValueError naming the problem when the line can't be imported.
+    """
+    if isinstance(values, str):
+        raise ValueError(values)
+    text, category, done, notes, created_at = values
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError("missing text")
+    category = category or default_category
+    notes = notes or ""
+    if not isinstance(category, str) or not isinstance(notes, str):
+        raise ValueError("category and notes must be text")
+    if isinstance(done, str):
+        flag = IMPORT_DONE_VALUES.get(done)
+        if flag is None:
+            flag = IMPORT_DONE_VALUES.get(done.strip().lower())
+    elif done is None:
+        flag = 0
+    elif isinstance(done, int) and done in (0, 1):
+        flag = int(done)
+    else:
+        flag = None
+    if flag is None:
+        raise ValueError(f"bad done value {done!r}")
+    if not created_at:
+        created_at = now
+    elif not isinstance(created_at, str) or not timestamp.match(created_at):
+        raise ValueError(f"bad created_at {created_at!r}")
+    elif len(created_at) != 19 or created_at[10] != " ":
+        # Stored as "YYYY-MM-DD HH:MM:SS" like the timestamps the app writes
+        created_at = created_at[:10] + " " + (created_at[11:19] or "00:00:00")
+    return (text, category, flag, notes, created_at, created_at if notes else None)
+
+
+def import_file(db, f, fmt, category="General", dedup=False, report=None):
+    """Stream records from f into the database; returns (imported, duplicates, rejected).
+
+    report(line number, reason) is called for every rejected record.
+    """
+    import re
+
+    timestamp = re.compile(r"\d{4}-\d\d-\d\d([ T]\d\d:\d\d:\d\d.*)?$")
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    rejected = [0]
+
+    def rows():
+        for line_no, record in read_import_records(f, fmt):
+            try:
+                yield import_row(record, category, now, timestamp)
+            except ValueError as e:
+                rejected[0] += 1
+                if report is not None:
+                    report(line_no, e)
+
+    def show_progress(count):
+        sys.stderr.write(f"\rread {count} rows")
+        sys.stderr.flush()
+
+    progress = show_progress if sys.stderr.isatty() else None
+    imported, duplicates = db.import_todos(rows(), dedup, progress=progress)
+    if progress is not None:
+        sys.stderr.write("\n")
+    return imported, duplicates, rejected[0]
+
+
+EXPORT_FORMATS = ("jsonl", "csv", "md")
+EXPORT_FIELDS = (
+    "id",
+    "category",
+    "text",
+    "done",
+    "notes",
+    "created_at",
+    "note_updated_at",
+)
+
+
+class LineEcho:
+    """Stand-in file for csv.writer: writerow() hands back the formatted line."""
+
+    def write(self, line):
+        return line
+
+
+def export_lines(rows, fmt):
+    """Format EXPORT_FIELDS rows as text, one task at a time."""
+    if fmt == "jsonl":
+        import json
+
+        # One encoder for the whole export; json.dumps builds one per call
+        # when given options
+        encode = json.JSONEncoder(ensure_ascii=False).encode
+        for row in rows:
+            record = dict(zip(EXPORT_FIELDS, row))
+            record["done"] = bool(record["done"])
+            yield encode(record) + "\n"
+    elif fmt == "csv":
+        import csv
+
+        writer = csv.writer(LineEcho())
+        yield writer.writerow(EXPORT_FIELDS)
+        for row in rows:
+            yield writer.writerow(row)
+    else:
+        # Markdown checklist with a section per category and notes quoted
+        category = None
+        for _, cat, text, done, notes, _, _ in rows:
+            if cat != category:
+                yield f"## {cat}\n\n" if category is None else f"\n## {cat}\n\n"
+                category = cat
+            yield f"- [{'x' if done else ' '}] {text}\n"
+            for line in notes.splitlines():
+                yield f"  > {line}\n" if line else "  >\n"
+
+
+def export_format(path):
+    """Guess the export format from a file name, ignoring a .gz suffix."""
+    if path.endswith(".gz"):
+        path = path[:-3]
+    if path.endswith(".csv"):
+        return "csv"
+    if path.endswith((".md", ".markdown")):
+        return "md"
+    return "jsonl"
+
+
+def open_export(path, compress=False):
+    """Open path, or stdout for "-", for writing text, gzip-compressed if asked."""
+    if path == "-":
+        # A duplicate descriptor, so closing the export leaves stdout open
+        fd = os.dup(sys.stdout.fileno())
+        if not compress:
+            return open(fd, "w", encoding="utf-8", newline="")
+        path = open(fd, "wb")
+    if compress:
+        import gzip
+
+        return gzip.open(path, "wt", compresslevel=6, encoding="utf-8", newline="")
+    return open(path, "w", encoding="utf-8", newline="")
+
+
+def export_todos(db, out, fmt, category=None, done=None, since=None, until=None):
+    """Stream matching tasks to out through export_lines; returns how many."""
+    count = [0]
+
+    def counted(rows):
+        for row in rows:
+            count[0] += 1
+            yield row
+
+    rows = db.export_rows(category, done, since, until)
+    out.writelines(export_lines(counted(rows), fmt))
+    return count[0]
+
+
+def date_bound(value, end=False):
+    """Normalize a --since/--until date to compare against created_at."""
+    if len(value) == 10:
+        value += " 23:59:59" if end else " 00:00:00"
+    value = value.replace("T", " ", 1)
+    try:
+        datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        raise ValueError(f"expected YYYY-MM-DD or YYYY-MM-DD HH:MM:SS, got {value!r}")
+    return value
+
+
+def cli(argv):
+    """Run one command line subcommand and return the exit status.
+
+    Only touches the database, never curses, so it is cheap enough to call
+    from scripts, cron jobs and git hooks.
+    """
+    if argv[0] in ("-h", "--help", "help"):
+        sys.stdout.write(CLI_USAGE)
+        return 0
+    try:
+        command, options, args = parse_args(argv)
+        if command in ("done", "rm"):
+            ids = parse_ids(args)
+        elif command == "notes":
+            ids = parse_ids(args[:1])
+            if len(args) > 2:
+                raise ValueError("notes takes a task id and at most one TEXT")
+        elif command == "add" and not args:
+            raise ValueError("missing task text")
+        elif command in ("ls", "export"):
+            if options.get("done") and options.get("pending"):
+                raise ValueError("--done and --pending are mutually exclusive")
+            done = (
+                True
+                if options.get("done")
+                else False
+                if options.get("pending")
+                else None
+            )
+        if command == "ls":
+            if options.get("format", "text") not in LS_FORMATS:
+                raise ValueError(f"--format must be one of {', '.join(LS_FORMATS)}")
+        elif command == "export":
+            if len(args) > 1:
+                raise ValueError("export takes at most one FILE")
+            path = args[0] if args else "-"
+            fmt = options.get("format") or export_format(path)
+            if fmt not in EXPORT_FORMATS:
+                raise ValueError(f"--format must be one of {', '.join(EXPORT_FORMATS)}")
+            since = options.get("since")
+            until = options.get("until")
+            if since is not None:
+                since = date_bound(since)
+            if until is not None:
+                until = date_bound(until, end=True)
+        elif command == "import":
+            if len(args) != 1:
+                raise ValueError("import takes one FILE, or - for stdin")
+            # Without --format, JSON Lines files are recognized by extension
+            fmt = options.get("format")
+            if fmt is None:
+                fmt = "jsonl" if args[0].endswith((".jsonl", ".ndjson")) else "csv"
+            if fmt not in IMPORT_FORMATS:
+                raise ValueError(f"--format must be one of {', '.join(IMPORT_FORMATS)}")
+        elif command == "archive":
+            if args:
+                raise ValueError("archive takes no arguments")
+            try:
+                days = int(options.get("days", ARCHIVE_AFTER_DAYS or 30))
+            except ValueError:
+                raise ValueError("--days must be a whole number")
+            if days < 0:
+                raise ValueError("--days cannot be negative")
+    except ValueError as e:
+        print(f"hydrotodo: {e}\n\n{CLI_USAGE}", file=sys.stderr, end="")
+        return 2
+
+    db = get_db()
+    db.init_schema()
+    status = 0
+    if command == "add":
+        category = options.get("category", "General")
+        # A task added to a closed tab brings the tab back
+        db.add_category(category)
+        print(db.add_todo(" ".join(args), category))
+    elif command in ("done", "rm"):
+        for todo_id in ids:
+            if command == "done":
+                found = db.update_todo_done(todo_id, not options.get("undo"))
+            else:
+                found = db.delete_todo(todo_id)
+            if not found:
+                print(f"hydrotodo: no task with id {todo_id}", file=sys.stderr)
+                status = 1
+    elif command == "ls":
+        list_todos(
+            db, sys.stdout, options.get("category"), done, options.get("format", "text")
+        )
+    elif command == "notes":
+        if db.get_todo(ids[0]) is None:
+            print(f"hydrotodo: no task with id {ids[0]}", file=sys.stderr)
+            return 1
+        if len(args) == 1:
+            notes = db.get_notes(ids[0])
+            if notes:
+                print(notes)
+        else:
+            text = sys.stdin.read() if args[1] == "-" else args[1]
+            db.update_todo_notes(ids[0], text)
+    elif command == "export":
+        try:
+            out = open_export(path, options.get("gzip") or path.endswith(".gz"))
+        except OSError as e:
+            print(f"hydrotodo: {e}", file=sys.stderr)
+            return 1
+        with out:
+            count = export_todos(
+                db, out, fmt, options.get("category"), done, since, until
+            )
+        if path != "-":
+            print(f"exported {count} tasks to {path}")
+    elif command == "import":
+
+        def report(line_no, reason):
+            print(f"hydrotodo: line {line_no}: {reason}", file=sys.stderr)
+
+        if args[0] == "-":
+            f = sys.stdin
+        else:
+            try:
+                f = open(args[0], newline="", encoding="utf-8")
+            except OSError as e:
+                print(f"hydrotodo: {e}", file=sys.stderr)
+                return 1
+        with f:
+            imported, duplicates, rejected = import_file(
+                db,
+                f,
+                fmt,
+                options.get("category", "General"),
+                options.get("dedup", False),
+                report,
+            )
+        print(
+            f"imported {imported} tasks, skipped {duplicates} duplicates,"
+            f" rejected {rejected} rows"
+        )
+        if rejected:
+            status = 1
+    elif command == "archive":
+        archiver = Archiver(db.path, archive_cutoff(days), pause=0)
+        archiver.run()
+        if options.get("vacuum"):
+            db.vacuum()
+        print(f"archived {archiver.moved} tasks")
+    return status
+
+
+def run_tui(profile=PROFILE):
+    """Open the interface; profile is a trace path, or "1" for PROFILE_PATH."""
+    global curses
+    import curses
+
+    profiler = None
+    if profile:
+        profiler = Profiler(PROFILE_PATH if profile == "1" else profile)
+    try:
+        curses.wrapper(main, profiler)
+    finally:
+        if profiler is not None:
+            profiler.close()
+
+
+def run(argv):
+    """Entry point: the interface without arguments, else one subcommand."""
     try:
-        curses.wrapper(main)
+        if argv == ["--profile"]:
+            run_tui("1")
+        elif argv:
+            sys.exit(cli(argv))
+        else:
+            run_tui()
     except KeyboardInterrupt:
         pass  # Exits silently on Ctrl+C
+    except BrokenPipeError:
+        # Output piped into e.g. head was cut short; silence the flush at exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    finally:
+        close_db()
+
+
+if __name__ == "__main__":
+    run(sys.argv[1:])
@@ -0,0 +1,129 @@
+"""TaskList paging checked against a plain list of the same tasks.
+
+    python3 -m pytest tests
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import hydrotodo
+
+CATEGORY = "General"
+
+
+def view_order(view, todos):
+    """The todos of a view, as the view's SQL lists them."""
+    spec = hydrotodo.TASK_VIEWS[view]
+    return sorted(
+        (todo for todo in todos if spec["test"](todo)),
+        key=lambda todo: tuple(todo[column] for column in spec["order"]),
+        reverse=spec["descending"],
+    )
+
+
+class TaskListTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="hydrotodo-test-")
+        self.db = hydrotodo.Database(os.path.join(self.dir, "test.db"))
+        self.db.init_schema()
+        self.rng = random.Random(0)
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.dir)
+
+    def fill(self, count):
+        self.db.import_todos(
+            (
+                f"task {i}",
+                CATEGORY,
+                i % 3 == 0,
+                "",
+                f"2024-01-01 00:{i % 60:02d}:00",
+                None,
+            )
+            for i in range(count)
+        )
+
+    def model(self):
+        """Every task of the category, read from the database."""
+        return [
+            hydrotodo.Todo(todo_id, text, bool(done), created_at, None)
+            for todo_id, text, done, created_at in self.db.conn.execute(
+                "SELECT id, text, done, created_at FROM todos WHERE category = ?",
+                (CATEGORY,),
+            )
+        ]
+
+    def assert_matches(self, todos, view):
+        expected = [todo.id for todo in view_order(view, self.model())]
+        self.assertEqual(len(todos), len(expected))
+        # Read each row with only the pages around it loaded, as the
+        # interface does while scrolling
+        start = self.rng.randrange(len(expected)) if expected else 0
+        for index in list(range(start, len(expected))) + list(range(start)):
+            todos.focus(index)
+            self.assertEqual(todos[index]["id"], expected[index], (view, index))
+
+    def test_delete_first_then_scroll(self):
+        self.fill(401)
+        todos = hydrotodo.TaskList(self.db, CATEGORY)
+        todos.focus(0)
+        todos.delete(0)
+        for index in range(len(todos)):
+            todos.focus(index)
+            todos[index]
+        self.assert_matches(todos, "all")
+
+    def test_random_edits_across_page_boundaries(self):
+        for view in ("all", "pending", "done", "newest"):
+            with self.subTest(view=view):
+                self.db.conn.execute("DELETE FROM todos")
+                self.db.conn.commit()
+                self.fill(60)
+                todos = hydrotodo.TaskList(self.db, CATEGORY, page_size=4, view=view)
+                for step in range(120):
+                    if len(todos):
+                        cursor = self.rng.randrange(len(todos))
+                        todos.focus(cursor)
+                    action = self.rng.choice(("delete", "toggle", "add"))
+                    if action == "add" or not len(todos):
+                        todo_id, index = todos.add(f"added {step}")
+                        self.assertIsNotNone(todo_id)
+                        if index is not None:
+                            self.assertEqual(todos[index]["id"], todo_id)
+                    elif action == "delete":
+                        todos.delete(cursor)
+                    else:
+                        todos.toggle(cursor)
+                    self.assert_matches(todos, view)
+
+    def test_add_hidden_by_view_still_counts(self):
+        self.fill(6)
+        store = hydrotodo.TaskStore(self.db)
+        store.set_view(CATEGORY, "done")
+        store.counts()
+        todo_id, index = store.add(CATEGORY, "new task")
+        self.assertIsNotNone(todo_id)
+        self.assertIsNone(index)
+        self.assertEqual(store.counts()[CATEGORY], self.db.category_counts()[CATEGORY])
+
+    def test_note_layouts_follow_the_notes_cache(self):
+        self.fill(10)
+        store = hydrotodo.TaskStore(self.db, max_notes=3)
+        todos = store.todos(CATEGORY)
+        for index in range(len(todos)):
+            store.set_notes(CATEGORY, index, f"note {index} " * 50)
+            store.note_layout(todos[index]["id"], 20).window(0, 5)
+        self.assertLessEqual(len(store._note_layouts), 3)
+        todo_id = todos[0]["id"]
+        store.set_notes(CATEGORY, 0, "edited")
+        _, lines, _ = store.note_layout(todo_id, 20).window(0, 5)
+        self.assertEqual(lines, ["edited"])
+
+
+if __name__ == "__main__":
+    unittest.main()